@@ -1,9 +1,12 @@
 from django.contrib import admin
 
-from .models import Location, Post, Category, Comment
+from .models import (Location, Post, Category, Comment, ImageJob,
+                     StoredImage)
 
 
 admin.site.register(Location)
 admin.site.register(Post)
 admin.site.register(Category)
 admin.site.register(Comment)
+admin.site.register(ImageJob)
+admin.site.register(StoredImage)
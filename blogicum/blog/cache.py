@@ -0,0 +1,353 @@
+import hashlib
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404
+from django.utils import timezone, translation
+
+from .models import Post, User, visibility_now
+from .paginators import invalidate_counts
+
+PROFILE_USER_KEY = 'blog:profile-user:{username}'
+PROFILE_USER_TIMEOUT = 60 * 60
+# после изменения пользователя запрос, прочитавший прежние поля,
+# не может вернуть их в кэш это время
+PROFILE_USER_FORGET_TIMEOUT = 10
+
+PAGE_KEY = 'blog:page:{digest}'
+PAGE_CACHE_TIMEOUT = 60 * 5
+PAGE_TAGS_KEY = 'blog:page-tags:{digest}'
+TAG_KEY = 'blog:tag:{tag}'
+POST_CARD_KEY = 'blog:post-card:{pk}:{version}'
+FRAGMENT_CACHE_TIMEOUT = 60 * 60
+SCHEDULED_KEY = 'blog:scheduled'
+RELEASE_CHECKED_KEY = 'blog:scheduled:checked'
+LOCK_KEY = 'blog:lock:{name}'
+LOCK_TIMEOUT = 10
+LOCK_WAIT = 1
+LOCK_POLL_INTERVAL = 0.05
+
+# поля пользователя, которые выводятся на странице профиля
+PROFILE_FIELDS = (
+    'id', 'username', 'first_name', 'last_name', 'date_joined', 'is_staff')
+
+
+def get_profile_user(username):
+    """
+    Возвращает пользователя для страницы профиля.
+    Кэшируются только поля, нужные шаблону, остальные поля
+    пользователя отложены, как у only(). Запись сбрасывается
+    сигналами при изменении этих полей и удалении пользователя.
+    """
+    key = PROFILE_USER_KEY.format(username=username)
+    row = cache.get(key)
+    if not row:
+        row = User.objects.filter(username=username).values(
+            *PROFILE_FIELDS).first()
+        if row is None:
+            raise Http404('Пользователь не найден')
+        # add не перезапишет отметку forget_profile_user
+        cache.add(key, row, PROFILE_USER_TIMEOUT)
+    field_names = [
+        field.attname for field in User._meta.concrete_fields
+        if field.attname in row]
+    return User.from_db(
+        User.objects.db, field_names, [row[name] for name in field_names])
+
+
+def forget_profile_user(username):
+    cache.set(
+        PROFILE_USER_KEY.format(username=username), {},
+        PROFILE_USER_FORGET_TIMEOUT)
+
+
+def _initial_tag_version():
+    # версия — время изменения тега в наносекундах, поэтому не совпадает
+    # с версией вытесненного из кэша тега и служит для Last-Modified
+    return time.time_ns()
+
+
+def get_tag_versions(tags):
+    """Текущие версии тегов, которыми помечены закэшированные страницы."""
+    keys = {TAG_KEY.format(tag=tag): tag for tag in tags}
+    found = cache.get_many(keys)
+    versions = {}
+    for key, tag in keys.items():
+        if key not in found:
+            cache.add(key, _initial_tag_version(), timeout=None)
+            found[key] = cache.get(key)
+        versions[tag] = found[key]
+    return versions
+
+
+def invalidate_tags(*tags):
+    """Делает недействительными все страницы, помеченные тегами."""
+    keys = [TAG_KEY.format(tag=tag) for tag in tags]
+    current = cache.get_many(keys)
+    now = _initial_tag_version()
+    cache.set_many({
+        key: max(now, current.get(key, 0) + 1) for key in keys
+    }, timeout=None)
+
+
+def page_validators(versions, user):
+    """
+    ETag и время изменения страницы по версиям её тегов.
+    Персональные части страницы учитываются через пользователя в ETag.
+    """
+    digest = hashlib.md5(repr(
+        (sorted(versions.items()), user.pk)).encode()).hexdigest()
+    last_modified = max(versions.values(), default=0) // 10 ** 9
+    return f'W/"{digest}"', last_modified
+
+
+def page_cache_lifetime():
+    """Наибольшее время жизни страницы в кэше."""
+    timeouts = getattr(
+        settings, 'BLOG_PAGE_CACHE_STALE_WHILE_REVALIDATE', {}).values()
+    return max((
+        getattr(settings, 'BLOG_PAGE_CACHE_TIMEOUT', PAGE_CACHE_TIMEOUT),
+        *(hard for soft, hard in timeouts)))
+
+
+def release_scheduled_posts():
+    """
+    Сбрасывает кэш лент, в которых наступило время отложенной публикации.
+    Время ближайшей отложенной публикации хранится в кэше,
+    поэтому до его наступления запросов к БД не выполняется.
+    Если запись истекла или вытеснена, сбрасываются ленты постов,
+    опубликованных после прошлой проверки, а если потеряно и время
+    проверки — за время жизни страниц в кэше.
+    """
+    now = visibility_now()
+    scheduled = cache.get(SCHEDULED_KEY)
+    if scheduled is not None:
+        if scheduled['next'] is None or scheduled['next'] > now:
+            return
+        since = scheduled['next']
+    else:
+        since = cache.get(RELEASE_CHECKED_KEY)
+        if since is None:
+            since = now - timedelta(seconds=page_cache_lifetime())
+    released = set(Post.objects.filter(
+        is_published=True,
+        pub_date__gte=since,
+        pub_date__lte=now,
+    ).values_list('category_id', 'author_id').distinct())
+    if released:
+        invalidate_tags(
+            'feed',
+            *{f'category-posts:{category_id}'
+              for category_id, author_id in released},
+            *{f'profile-posts:{author_id}'
+              for category_id, author_id in released})
+        invalidate_counts()
+    cache.set(RELEASE_CHECKED_KEY, now, timeout=None)
+    next_pub_date = Post.objects.scheduled().order_by(
+        'pub_date').values_list('pub_date', flat=True).first()
+    cache.set(SCHEDULED_KEY, {'next': next_pub_date}, getattr(
+        settings, 'BLOG_PAGE_CACHE_TIMEOUT', PAGE_CACHE_TIMEOUT))
+
+
+def schedule_post(post):
+    """
+    Учитывает время публикации сохранённого поста.
+    Лишний сброс кэша безвреден, поэтому удалённые и снятые
+    с публикации посты из расписания не вычёркиваются.
+    """
+    scheduled = cache.get(SCHEDULED_KEY)
+    if scheduled is None or not post.is_published:
+        return
+    if post.pub_date > visibility_now() and (
+            scheduled['next'] is None or post.pub_date < scheduled['next']):
+        cache.set(SCHEDULED_KEY, {'next': post.pub_date}, getattr(
+            settings, 'BLOG_PAGE_CACHE_TIMEOUT', PAGE_CACHE_TIMEOUT))
+
+
+def forget_scheduled_posts():
+    cache.delete(SCHEDULED_KEY)
+
+
+def post_tags(posts):
+    """Теги публикаций, выведенных на странице, и связанных с ними объектов."""
+    tags = set()
+    for post in posts:
+        tags.add(f'post:{post.pk}')
+        tags.add(f'user:{post.author_id}')
+        if post.category_id is not None:
+            tags.add(f'category:{post.category_id}')
+        if post.location_id is not None:
+            tags.add(f'location:{post.location_id}')
+    return tags
+
+
+def page_cache_key(request):
+    digest = hashlib.md5(
+        request.get_full_path().encode()).hexdigest()
+    return PAGE_KEY.format(digest=digest)
+
+
+def _page_tags_key(request):
+    digest = hashlib.md5(repr(
+        (request.get_full_path(), request.user.pk)).encode()).hexdigest()
+    return PAGE_TAGS_KEY.format(digest=digest)
+
+
+def get_page_tags(request):
+    """Теги страницы, выведенной на прошлый запрос, или None."""
+    return cache.get(_page_tags_key(request))
+
+
+def set_page_tags(request, tags):
+    """
+    Запоминает теги выведенной страницы без её содержимого:
+    по их версиям проверяются условные запросы без кэша страниц.
+    Теги хранятся не дольше страниц: за это время release_scheduled_posts
+    учитывает наступившие отложенные публикации.
+    """
+    cache.set(_page_tags_key(request), set(tags), page_cache_lifetime())
+
+
+class CacheLock:
+    """
+    Блокировка на время построения значения кэша.
+    Основана на атомарном cache.add, поэтому с общим кэшем
+    (memcached, redis, БД) действует во всех процессах.
+    Время жизни ограничено, чтобы упавший процесс не держал её вечно.
+    """
+
+    def __init__(self, name):
+        self.key = LOCK_KEY.format(name=name)
+        self.token = uuid.uuid4().hex
+        self.acquired = False
+
+    def acquire(self):
+        self.acquired = cache.add(self.key, self.token, getattr(
+            settings, 'BLOG_CACHE_LOCK_TIMEOUT', LOCK_TIMEOUT))
+        return self.acquired
+
+    def release(self):
+        if self.acquired and cache.get(self.key) == self.token:
+            cache.delete(self.key)
+        self.acquired = False
+
+
+def wait_for(lookup):
+    """
+    Ждёт значение, которое строит другой процесс.
+    Возвращает None, если оно не появилось за BLOG_CACHE_LOCK_WAIT секунд.
+    """
+    deadline = time.monotonic() + getattr(
+        settings, 'BLOG_CACHE_LOCK_WAIT', LOCK_WAIT)
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        value = lookup()
+        if value is not None:
+            return value
+    return None
+
+
+def get_cached_page(key, stale=False):
+    """
+    Возвращает закэшированную страницу, если её теги не устарели.
+    С stale=True возвращает и устаревшую страницу, отмечая её
+    ключом 'stale'.
+    """
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    entry['stale'] = get_tag_versions(entry['tags']) != entry['tags']
+    if entry['stale'] and not stale:
+        return None
+    return entry
+
+
+def set_cached_page(key, response, tags, versions=None, timeout=None):
+    """
+    Кэширует отрендеренный ответ вместе с версиями его тегов.
+    Версии, полученные до рендеринга, передаются в versions,
+    чтобы изменение во время рендеринга не закрепило устаревшую страницу.
+    """
+    versions = dict(versions or {})
+    versions.update(get_tag_versions(set(tags) - set(versions)))
+    if timeout is None:
+        timeout = getattr(
+            settings, 'BLOG_PAGE_CACHE_TIMEOUT', PAGE_CACHE_TIMEOUT)
+    cache.set(key, {
+        'content': response.content.decode(response.charset),
+        'content_type': response['Content-Type'],
+        'tags': versions,
+        'created': time.time(),
+    }, timeout)
+    return versions
+
+
+class FragmentCacheStats:
+    """Счётчики попаданий и промахов кэша фрагментов в текущем процессе."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def miss(self):
+        with self._lock:
+            self.misses += 1
+
+
+fragment_stats = FragmentCacheStats()
+
+
+def post_card_version(post):
+    """
+    Версия карточки поста.
+    Меняется вместе с любыми выводимыми в карточке данными поста,
+    его категории, местоположения и числа комментариев.
+    """
+    category = post.category
+    location = post.location
+    parts = (
+        post.title, post.text, post.pub_date.isoformat(), post.is_published,
+        post.image.name, post.image_pending, post.image_width,
+        post.image_height, post.image_placeholder, post.image_variants,
+        post.comment_count, post.author.username,
+        category and (category.slug, category.title, category.is_published),
+        location and (location.name, location.is_published),
+        translation.get_language(), timezone.get_current_timezone_name(),
+    )
+    return hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def get_post_card(post, render):
+    """Возвращает HTML карточки поста из кэша или рендерит его."""
+    key = POST_CARD_KEY.format(pk=post.pk, version=post_card_version(post))
+    html = cache.get(key)
+    if html is not None:
+        fragment_stats.hit()
+        return html
+    fragment_stats.miss()
+    lock = CacheLock(key)
+    if not lock.acquire():
+        # карточку уже рендерит другой процесс
+        html = wait_for(lambda: cache.get(key))
+        if html is not None:
+            return html
+    try:
+        html = render()
+        cache.set(key, html, getattr(
+            settings, 'BLOG_FRAGMENT_CACHE_TIMEOUT', FRAGMENT_CACHE_TIMEOUT))
+    finally:
+        lock.release()
+    return html
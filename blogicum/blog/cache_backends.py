@@ -0,0 +1,321 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+LOCAL_MAX_ENTRIES = 1000
+LOCAL_MAX_SIZE = 16 * 1024 * 1024
+LOCAL_TIMEOUT = 5
+SYNC_INTERVAL = 1
+# сколько событий канала инвалидации хранится в общем кэше
+EVENTS_TIMEOUT = 60 * 5
+MAX_EVENTS = 1000
+# событие очистки всего кэша; ключи кэша содержат версию и не совпадают
+CLEAR_EVENT = '*'
+# ключи, которые читаются и пишутся только в общем кэше: блокировки
+# CacheLock живут секунды, а их копия в процессе устаревала бы сразу
+SHARED_ONLY_PREFIXES = ('blog:lock:',)
+
+
+class LocalLRU:
+    """
+    Ограниченный по числу записей и общему размеру LRU-кэш процесса.
+    Значения хранятся сериализованными: размер известен точно,
+    а вызывающий код не может изменить закэшированный объект.
+    """
+
+    def __init__(self, max_entries, max_size):
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.size = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires <= time.monotonic():
+                self._pop(key)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        if len(value) > self.max_size:
+            self.delete(key)
+            return
+        with self._lock:
+            self._pop(key)
+            self._data[key] = (time.monotonic() + timeout, value)
+            self.size += len(value)
+            while (len(self._data) > self.max_entries
+                   or self.size > self.max_size):
+                self._pop(next(iter(self._data)))
+
+    def delete(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def _pop(self, key):
+        item = self._data.pop(key, None)
+        if item is not None:
+            self.size -= len(item[1])
+
+
+class TwoTierCache(BaseCache):
+    """
+    Кэш процесса перед общим кэшем Django.
+
+    Прочитанные значения хранятся в LRU процесса не дольше LOCAL_TIMEOUT
+    секунд, запись идёт в общий кэш. Каждая запись публикуется в канале
+    инвалидации в общем кэше; остальные процессы не реже раза в
+    SYNC_INTERVAL секунд читают его и удаляют у себя изменённые ключи.
+    Ключи с префиксами из SHARED_ONLY_PREFIXES в процессе не хранятся,
+    и их запись в канале не публикуется.
+
+    Общий кэш должен выполнять add и incr атомарно, как memcached
+    и Redis. У FileBasedCache и DatabaseCache они не атомарны: два
+    процесса могут опубликовать события под одним номером, и одно из них
+    потеряется, а CacheLock перестанет гарантировать единственного
+    владельца блокировки.
+
+    Пример настройки:
+
+        CACHES = {
+            'default': {
+                'BACKEND': 'blog.cache_backends.TwoTierCache',
+                'LOCATION': 'shared',
+                'OPTIONS': {'LOCAL_TIMEOUT': 5, 'SYNC_INTERVAL': 1},
+            },
+            'shared': {
+                'BACKEND': 'django.core.cache.backends.memcached.'
+                           'PyMemcacheCache',
+                'LOCATION': '127.0.0.1:11211',
+            },
+        }
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = location
+        self.local = LocalLRU(
+            options.get('LOCAL_MAX_ENTRIES', LOCAL_MAX_ENTRIES),
+            options.get('LOCAL_MAX_SIZE', LOCAL_MAX_SIZE))
+        self.local_timeout = options.get('LOCAL_TIMEOUT', LOCAL_TIMEOUT)
+        self.sync_interval = options.get('SYNC_INTERVAL', SYNC_INTERVAL)
+        self.channel = options.get('CHANNEL', 'two-tier-cache')
+        self.shared_only_prefixes = tuple(
+            options.get('SHARED_ONLY_PREFIXES', SHARED_ONLY_PREFIXES))
+        self._synced_at = None
+        self._seen = None
+        self._sync_lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def _shared_only(self, key):
+        return key.startswith(self.shared_only_prefixes)
+
+    def _local_key(self, key, version):
+        return self.shared.make_key(key, version=version)
+
+    def _remember(self, key, value, timeout=DEFAULT_TIMEOUT):
+        if timeout is DEFAULT_TIMEOUT or timeout is None:
+            timeout = self.local_timeout
+        timeout = min(self.local_timeout, timeout)
+        if timeout <= 0:
+            self.local.delete(key)
+            return
+        self.local.set(
+            key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), timeout)
+
+    # канал инвалидации
+
+    def _seq_key(self):
+        return f'{self.channel}:seq'
+
+    def _event_key(self, number):
+        return f'{self.channel}:event:{number}'
+
+    def _publish(self, *keys):
+        """Сообщает остальным процессам об изменении ключей."""
+        try:
+            number = self.shared.incr(self._seq_key())
+        except ValueError:
+            self.shared.add(self._seq_key(), 0, timeout=None)
+            number = self.shared.incr(self._seq_key())
+        self.shared.set(self._event_key(number), keys, EVENTS_TIMEOUT)
+
+    def sync(self, force=False):
+        """Удаляет из кэша процесса ключи, изменённые другими процессами."""
+        now = time.monotonic()
+        if (not force and self._synced_at is not None
+                and now - self._synced_at < self.sync_interval):
+            return
+        with self._sync_lock:
+            self._synced_at = now
+            seq = self.shared.get(self._seq_key(), 0)
+            seen, self._seen = self._seen, seq
+            if seen is None or seq == seen:
+                return
+            numbers = range(seen + 1, seq + 1)
+            if seq < seen or len(numbers) > MAX_EVENTS:
+                self.local.clear()
+                return
+            events = self.shared.get_many(
+                [self._event_key(number) for number in numbers])
+            if len(events) < len(numbers):
+                # часть событий потеряна, доверять кэшу процесса нельзя
+                self.local.clear()
+                return
+            for keys in events.values():
+                if CLEAR_EVENT in keys:
+                    self.local.clear()
+                    return
+                for key in keys:
+                    self.local.delete(key)
+
+    # интерфейс кэша Django
+
+    def get(self, key, default=None, version=None):
+        if self._shared_only(key):
+            return self.shared.get(key, default, version=version)
+        self.sync()
+        local_key = self._local_key(key, version)
+        value = self.local.get(local_key)
+        if value is not None:
+            return pickle.loads(value)
+        sentinel = object()
+        value = self.shared.get(key, sentinel, version=version)
+        if value is sentinel:
+            return default
+        self._remember(local_key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        self.sync()
+        found = {}
+        missing = []
+        for key in keys:
+            if self._shared_only(key):
+                missing.append(key)
+                continue
+            value = self.local.get(self._local_key(key, version))
+            if value is None:
+                missing.append(key)
+            else:
+                found[key] = pickle.loads(value)
+        if missing:
+            shared = self.shared.get_many(missing, version=version)
+            for key, value in shared.items():
+                if not self._shared_only(key):
+                    self._remember(self._local_key(key, version), value)
+            found.update(shared)
+        return found
+
+    def has_key(self, key, version=None):
+        if self._shared_only(key):
+            return self.shared.has_key(key, version=version)  # noqa: W601
+        self.sync()
+        if self.local.get(self._local_key(key, version)) is not None:
+            return True
+        return self.shared.has_key(key, version=version)  # noqa: W601
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        if self._shared_only(key):
+            return
+        local_key = self._local_key(key, version)
+        self._remember(local_key, value, timeout)
+        self._publish(local_key)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        # атомарность add обеспечивает общий кэш
+        added = self.shared.add(key, value, timeout, version=version)
+        if added and not self._shared_only(key):
+            local_key = self._local_key(key, version)
+            self._remember(local_key, value, timeout)
+            self._publish(local_key)
+        return added
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version)
+        local_keys = []
+        for key, value in data.items():
+            if self._shared_only(key):
+                continue
+            local_key = self._local_key(key, version)
+            local_keys.append(local_key)
+            if key in failed:
+                self.local.delete(local_key)
+            else:
+                self._remember(local_key, value, timeout)
+        if local_keys:
+            self._publish(*local_keys)
+        return failed
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        if self._shared_only(key):
+            return self.shared.touch(key, timeout, version=version)
+        local_key = self._local_key(key, version)
+        self.local.delete(local_key)
+        touched = self.shared.touch(key, timeout, version=version)
+        self._publish(local_key)
+        return touched
+
+    def delete(self, key, version=None):
+        if self._shared_only(key):
+            return self.shared.delete(key, version=version)
+        local_key = self._local_key(key, version)
+        self.local.delete(local_key)
+        deleted = self.shared.delete(key, version=version)
+        self._publish(local_key)
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        local_keys = [
+            self._local_key(key, version) for key in keys
+            if not self._shared_only(key)]
+        for local_key in local_keys:
+            self.local.delete(local_key)
+        self.shared.delete_many(keys, version=version)
+        if local_keys:
+            self._publish(*local_keys)
+
+    def incr(self, key, delta=1, version=None):
+        if self._shared_only(key):
+            return self.shared.incr(key, delta, version=version)
+        local_key = self._local_key(key, version)
+        self.local.delete(local_key)
+        value = self.shared.incr(key, delta, version=version)
+        self._publish(local_key)
+        return value
+
+    def clear(self):
+        seq = self.shared.get(self._seq_key(), 0)
+        self.local.clear()
+        self.shared.clear()
+        # номер канала продолжается, иначе процессы, уже видевшие
+        # номера после очистки, пропустили бы её событие
+        self.shared.add(self._seq_key(), seq, timeout=None)
+        self._publish(CLEAR_EVENT)
+        self._seen = None
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
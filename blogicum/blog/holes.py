@@ -0,0 +1,36 @@
+"""
+Персональные части закэшированных страниц.
+
+Общая для всех пользователей страница рендерится с заглушками вместо
+персональных фрагментов (шапка, форма комментария, кнопки автора),
+а фрагменты подставляются для каждого запроса отдельно.
+"""
+import base64
+import json
+import re
+
+from django.template.loader import get_template
+
+HOLE_RE = re.compile(r'<!--blog-hole:([A-Za-z0-9_=-]+)-->')
+
+
+def make_hole(template_name, params):
+    """Заглушка персонального фрагмента для общей страницы."""
+    payload = json.dumps([template_name, params], separators=(',', ':'))
+    token = base64.urlsafe_b64encode(payload.encode()).decode()
+    return f'<!--blog-hole:{token}-->'
+
+
+def fill_holes(content, request, extra_context=None):
+    """Подставляет в общую страницу фрагменты для текущего пользователя."""
+    templates = {}
+
+    def render(match):
+        template_name, params = json.loads(
+            base64.urlsafe_b64decode(match.group(1)))
+        if template_name not in templates:
+            templates[template_name] = get_template(template_name)
+        return templates[template_name].render(
+            {**(extra_context or {}), **params}, request)
+
+    return HOLE_RE.sub(render, content)
@@ -0,0 +1,305 @@
+import base64
+import posixpath
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import ExifTags, Image, ImageFilter, ImageOps, features
+
+THUMBNAIL_WIDTHS = (320, 640, 960, 1280)
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+PLACEHOLDER_SIZE = 16
+PLACEHOLDER_QUALITY = 50
+# APP1 (EXIF, XMP), APP13 (IPTC) и комментарий
+JPEG_METADATA_MARKERS = (0xE1, 0xED, 0xFE)
+PNG_METADATA_CHUNKS = (b'eXIf', b'tEXt', b'zTXt', b'iTXt')
+# ориентации EXIF, при которых изображение поворачивается на 90°
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+def get_thumbnail_widths():
+    return sorted(getattr(
+        settings, 'BLOG_THUMBNAIL_WIDTHS', THUMBNAIL_WIDTHS))
+
+
+def thumbnail_name(name, width):
+    """
+    Имя уменьшенной копии рядом с оригиналом:
+    image/a.jpg → image/a.w320.jpg.
+    """
+    root, ext = posixpath.splitext(name)
+    return f'{root}.w{width}{ext}'
+
+
+def webp_name(name, width=None):
+    """
+    Имя WebP-копии: image/a.jpg → image/a.jpg.webp, image/a.jpg.w320.webp.
+    Расширение оригинала сохраняется, чтобы копии a.jpg и a.png
+    не совпадали.
+    """
+    if width is None:
+        return f'{name}.webp'
+    return f'{name}.w{width}.webp'
+
+
+def webp_enabled():
+    return (getattr(settings, 'BLOG_WEBP', True)
+            and features.check('webp'))
+
+
+def _save_image(image, image_format):
+    buffer = BytesIO()
+    if image_format == 'JPEG':
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        image.save(buffer, image_format, quality=JPEG_QUALITY,
+                   optimize=True, progressive=True)
+    else:
+        image.save(buffer, image_format, optimize=True)
+    return ContentFile(buffer.getvalue())
+
+
+def encode_webp(image, image_format):
+    """
+    Кодирует изображение в WebP.
+    Фотографии в JPEG сжимаются с потерями, изображения без потерь
+    (PNG, GIF) — без потерь: для графики с плоскими заливками
+    WebP с потерями часто больше оригинала.
+    """
+    if image.mode not in ('RGB', 'RGBA'):
+        alpha = 'A' in image.getbands() or 'transparency' in image.info
+        image = image.convert('RGBA' if alpha else 'RGB')
+    buffer = BytesIO()
+    if image_format == 'JPEG':
+        image.save(buffer, 'WEBP', method=6, quality=getattr(
+            settings, 'BLOG_WEBP_QUALITY', WEBP_QUALITY))
+    else:
+        image.save(buffer, 'WEBP', method=6, lossless=True)
+    return ContentFile(buffer.getvalue())
+
+
+def _strip_jpeg(data):
+    """
+    Удаляет из JPEG сегменты EXIF, XMP, IPTC и комментарии без
+    перекодирования. Ориентация сохраняется в минимальном EXIF.
+    Возвращает None, если структура файла не распознана.
+    """
+    if data[:2] != b'\xff\xd8':
+        return None
+    segments = [b'\xff\xd8']
+    orientation = None
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            # байты-заполнители между сегментами
+            pos += 1
+            continue
+        if marker == 0xDA:
+            # начало сжатых данных: дальше метаданных нет
+            if orientation not in (None, 1):
+                exif = Image.Exif()
+                exif[ExifTags.Base.Orientation] = orientation
+                payload = exif.tobytes()
+                # EXIF следует сразу за SOI или сегментом JFIF
+                jfif = len(segments) > 1 and segments[1][:2] == b'\xff\xe0'
+                segments.insert(2 if jfif else 1, (
+                    b'\xff\xe1' + (len(payload) + 2).to_bytes(2, 'big')
+                    + payload))
+            segments.append(data[pos:])
+            return b''.join(segments)
+        length = int.from_bytes(data[pos + 2:pos + 4], 'big')
+        segment = data[pos:pos + 2 + length]
+        if marker == 0xE1 and segment[4:10] == b'Exif\x00\x00':
+            exif = Image.Exif()
+            exif.load(segment[10:])
+            orientation = exif.get(ExifTags.Base.Orientation)
+        elif marker not in JPEG_METADATA_MARKERS:
+            # JFIF, ICC-профиль и таблицы кодирования сохраняются
+            segments.append(segment)
+        pos += 2 + length
+    return None
+
+
+def _strip_png(data):
+    """Удаляет из PNG текстовые чанки и EXIF."""
+    if data[:8] != b'\x89PNG\r\n\x1a\n':
+        return None
+    chunks = [data[:8]]
+    pos = 8
+    while pos + 12 <= len(data):
+        length = int.from_bytes(data[pos:pos + 4], 'big')
+        chunk = data[pos:pos + 12 + length]
+        if chunk[4:8] not in PNG_METADATA_CHUNKS:
+            chunks.append(chunk)
+        pos += 12 + length
+    return b''.join(chunks)
+
+
+def strip_metadata(data):
+    """
+    Удаляет метаданные (в том числе координаты съёмки) из JPEG и PNG
+    без перекодирования. Остальные форматы и нераспознанные файлы
+    возвращаются без изменений.
+    """
+    stripped = _strip_jpeg(data) or _strip_png(data)
+    return data if stripped is None else stripped
+
+
+def make_placeholder(image):
+    """
+    Заглушка изображения: размытая копия не больше PLACEHOLDER_SIZE
+    пикселей по большей стороне в виде data URI JPEG (несколько сотен
+    байт), которая показывается фоном до загрузки изображения.
+    """
+    width, height = image.size
+    scale = PLACEHOLDER_SIZE / max(width, height)
+    small = image.resize(
+        (max(1, round(width * scale)), max(1, round(height * scale))),
+        Image.Resampling.BOX)
+    if small.mode not in ('RGB', 'L'):
+        rgba = small.convert('RGBA')
+        small = Image.new('RGB', rgba.size, 'white')
+        small.paste(rgba, mask=rgba)
+    small = small.filter(ImageFilter.GaussianBlur(1))
+    buffer = BytesIO()
+    small.save(buffer, 'JPEG', quality=PLACEHOLDER_QUALITY)
+    encoded = base64.b64encode(buffer.getvalue()).decode('ascii')
+    return f'data:image/jpeg;base64,{encoded}'
+
+
+def image_fields(field_file):
+    """
+    Размеры изображения с учётом ориентации EXIF и его заглушка
+    для сохранения в полях поста или None, если файл не удалось прочитать.
+    JPEG декодируется в уменьшенном размере, поэтому чтение быстрое.
+    """
+    try:
+        with field_file.storage.open(field_file.name) as file:
+            image = Image.open(file)
+            width, height = image.size
+            if image.getexif().get(
+                    ExifTags.Base.Orientation) in TRANSPOSED_ORIENTATIONS:
+                width, height = height, width
+            image.draft('RGB', (PLACEHOLDER_SIZE * 4, PLACEHOLDER_SIZE * 4))
+            image = ImageOps.exif_transpose(image)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+    return {
+        'image_width': width,
+        'image_height': height,
+        'image_placeholder': make_placeholder(image),
+    }
+
+
+def _resizer(image, size):
+    """Уменьшает изображение один раз для всех форматов копий."""
+    resized = []
+
+    def resize():
+        if not resized:
+            resized.append(image.resize(size, Image.Resampling.LANCZOS))
+        return resized[0]
+    return resize
+
+
+def _store(storage, name, force, render, reference=None):
+    """
+    Сохраняет копию изображения, если её ещё нет, и возвращает её URL.
+    WebP-копия сохраняется, только если она меньше копии
+    в формате оригинала reference; иначе вместо неё сохраняется пустой
+    файл, чтобы не кодировать её повторно, и возвращается None.
+    """
+    # хранилище по содержимому сохраняет копию под заданным именем
+    save = getattr(storage, 'save_derivative', storage.save)
+    if force or not storage.exists(name):
+        content = render()
+        storage.delete(name)
+        if reference is not None and content.size >= storage.size(reference):
+            save(name, ContentFile(b''))
+            return None
+        save(name, content)
+    elif reference is not None and not storage.size(name):
+        return None
+    return storage.url(name)
+
+
+def _srcset(sources):
+    return ', '.join(f'{url} {size}w' for url, size in sources)
+
+
+def make_thumbnails(field_file, force=False):
+    """
+    Создаёт уменьшенные копии изображения шириной из BLOG_THUMBNAIL_WIDTHS
+    в формате оригинала и WebP-копии всех размеров.
+    Копии шире оригинала не создаются, существующие пересоздаются
+    только с force=True. Возвращает размеры, srcset, заглушку и список
+    созданных копий изображения или None, если файл не удалось прочитать.
+    """
+    storage = field_file.storage
+    try:
+        with storage.open(field_file.name) as file:
+            image = Image.open(file)
+            image_format = image.format
+            animated = getattr(image, 'is_animated', False)
+            image = ImageOps.exif_transpose(image)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+    width, height = image.size
+    name = field_file.name
+    webp = webp_enabled() and image_format != 'WEBP' and not animated
+    variants = {'widths': [], 'webp': []}
+    if not animated:
+        for target in get_thumbnail_widths():
+            if target >= width:
+                break
+            resize = _resizer(
+                image, (target, max(1, round(height * target / width))))
+            _store(storage, thumbnail_name(name, target), force,
+                   lambda: _save_image(resize(), image_format))
+            variants['widths'].append(target)
+            if webp and _store(
+                    storage, webp_name(name, target), force,
+                    lambda: encode_webp(resize(), image_format),
+                    reference=thumbnail_name(name, target)):
+                variants['webp'].append(target)
+    if webp and _store(
+            storage, webp_name(name), force,
+            lambda: encode_webp(image, image_format), reference=name):
+        variants['webp'].append(width)
+    return {
+        'width': width,
+        'height': height,
+        'variants': variants,
+        'placeholder': make_placeholder(image),
+        **image_sources(field_file, width, variants),
+    }
+
+
+def image_sources(field_file, width, variants):
+    """
+    srcset изображения и его WebP-копий по списку созданных копий.
+    Имена копий вычисляются, поэтому файлы не читаются.
+    """
+    name = field_file.name
+    storage = field_file.storage
+    sources = [
+        (storage.url(thumbnail_name(name, size)), size)
+        for size in variants.get('widths', ())]
+    sources.append((field_file.url, width))
+    webp_sources = [
+        (storage.url(webp_name(name, None if size == width else size)), size)
+        for size in variants.get('webp', ())]
+    return {'srcset': _srcset(sources), 'webp_srcset': _srcset(webp_sources)}
+
+
+def delete_image(storage, name):
+    """Удаляет изображение вместе с уменьшенными и WebP-копиями."""
+    names = [name, webp_name(name)]
+    for width in get_thumbnail_widths():
+        names += [thumbnail_name(name, width), webp_name(name, width)]
+    for derived in names:
+        storage.delete(derived)
@@ -0,0 +1,147 @@
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .cache import invalidate_tags
+from .images import make_thumbnails
+from .models import ImageJob, Post
+
+MAX_ATTEMPTS = 3
+JOB_TIMEOUT = 60 * 5
+
+
+def enqueue_image_job(post):
+    """Ставит в очередь обработку изображения поста."""
+    ImageJob.objects.create(post=post, image=post.image.name)
+
+
+def request_image_job(post):
+    """
+    Ставит в очередь обработку изображения, загруженного до появления
+    копий в БД. Вызывается при рендеринге; условный UPDATE не даёт
+    поставить задачу повторно.
+    """
+    marked = Post.objects.filter(
+        pk=post.pk, image=post.image.name, image_pending=False,
+        image_variants__isnull=True,
+    ).update(image_pending=True)
+    if marked:
+        enqueue_image_job(post)
+
+
+def store_image_info(post_id, name, info):
+    """
+    Сохраняет в посте размеры, заглушку и список копий изображения,
+    если изображение поста не заменили. info None — файл не прочитан:
+    копий нет, повторно изображение не обрабатывается.
+    """
+    fields = {'image_variants': {}}
+    if info is not None:
+        # размеры с учётом ориентации EXIF уточняют прочитанные при загрузке
+        fields = {
+            'image_width': info['width'],
+            'image_height': info['height'],
+            'image_placeholder': info['placeholder'],
+            'image_variants': info['variants'],
+        }
+    Post.objects.filter(pk=post_id, image=name).update(**fields)
+
+
+def _max_attempts():
+    return getattr(settings, 'BLOG_IMAGE_JOB_MAX_ATTEMPTS', MAX_ATTEMPTS)
+
+
+def requeue_stale_jobs():
+    """
+    Возвращает в очередь задачи, которые не завершились
+    за BLOG_IMAGE_JOB_TIMEOUT секунд: их исполнитель, скорее всего, упал.
+    Задачи, исчерпавшие попытки, помечаются как неудачные: изображение,
+    на котором падает исполнитель, не обрабатывается бесконечно.
+    """
+    timeout = getattr(settings, 'BLOG_IMAGE_JOB_TIMEOUT', JOB_TIMEOUT)
+    stale = ImageJob.objects.filter(
+        status=ImageJob.RUNNING,
+        started_at__lt=timezone.now() - timedelta(seconds=timeout),
+    )
+    for job in stale.filter(attempts__gte=_max_attempts()):
+        store_image_info(job.post_id, job.image, None)
+        _finish(job, ImageJob.FAILED,
+                f'Исполнитель не завершил задачу за {timeout} с.')
+    return stale.filter(attempts__lt=_max_attempts()).update(
+        status=ImageJob.PENDING)
+
+
+def claim_jobs(limit):
+    """
+    Забирает из очереди до limit задач.
+    Задача переводится в статус «выполняется» условным UPDATE,
+    поэтому одну задачу не заберут два исполнителя.
+    """
+    claimed = []
+    candidates = ImageJob.objects.filter(
+        status=ImageJob.PENDING).values_list('pk', flat=True)[:limit]
+    for pk in candidates:
+        updated = ImageJob.objects.filter(
+            pk=pk, status=ImageJob.PENDING,
+        ).update(
+            status=ImageJob.RUNNING, started_at=timezone.now(),
+            attempts=F('attempts') + 1)
+        if updated:
+            claimed.append(pk)
+    return claimed
+
+
+def _finish(job, status, error=''):
+    with transaction.atomic():
+        ImageJob.objects.filter(pk=job.pk).update(status=status, error=error)
+        still_pending = ImageJob.objects.filter(
+            post_id=job.post_id,
+            status__in=(ImageJob.PENDING, ImageJob.RUNNING),
+        ).exists()
+        if not still_pending:
+            Post.objects.filter(pk=job.post_id).update(image_pending=False)
+    # обновление без сигналов, страницы поста сбрасываются явно
+    invalidate_tags(f'post:{job.post_id}')
+
+
+def run_image_job(pk):
+    """
+    Создаёт производные изображения: уменьшенные копии и заглушку.
+    При ошибке задача возвращается в очередь, пока не исчерпаны
+    BLOG_IMAGE_JOB_MAX_ATTEMPTS попыток. Возвращает новый статус задачи.
+    """
+    job = ImageJob.objects.select_related('post').filter(pk=pk).first()
+    if job is None:
+        # пост удалили вместе с задачей, пока она ждала исполнителя
+        return ImageJob.DONE
+    if job.post.image.name != job.image:
+        # изображение заменили, его обработает более новая задача
+        _finish(job, ImageJob.DONE)
+        return ImageJob.DONE
+    try:
+        info = make_thumbnails(job.post.image, force=True)
+        if info is None:
+            raise ValueError(f'Не удалось прочитать {job.image}')
+    except Exception:
+        if job.attempts >= _max_attempts():
+            store_image_info(job.post_id, job.image, None)
+            _finish(job, ImageJob.FAILED, traceback.format_exc())
+            return ImageJob.FAILED
+        ImageJob.objects.filter(pk=pk).update(
+            status=ImageJob.PENDING, error=traceback.format_exc())
+        return ImageJob.PENDING
+    store_image_info(job.post_id, job.image, info)
+    _finish(job, ImageJob.DONE)
+    return ImageJob.DONE
+
+
+def run_image_job_in_worker(pk):
+    """Выполняет задачу в процессе пула и закрывает его подключения к БД."""
+    try:
+        return run_image_job(pk)
+    finally:
+        connections.close_all()
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from blog.cache import invalidate_tags
+from blog.images import image_fields
+from blog.models import Post
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет размеры и заглушки изображений публикаций, '
+        'загруженных до появления этих полей.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересчитать размеры и заглушки всех изображений.')
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Количество публикаций, обрабатываемых за один запрос.')
+
+    def handle(self, *args, **options):
+        processed = 0
+        failed = []
+        posts = Post.objects.exclude(image='')
+        if not options['force']:
+            posts = posts.filter(
+                Q(image_width__isnull=True) | Q(image_placeholder=''))
+        posts = posts.values_list('pk', 'image')
+        for pk, name in posts.iterator(chunk_size=options['batch_size']):
+            post = Post(pk=pk, image=name)
+            fields = image_fields(post.image)
+            if fields is None:
+                failed.append(name)
+                continue
+            # обновление без сигналов, страницы поста сбрасываются явно
+            Post.objects.filter(pk=pk, image=name).update(**fields)
+            invalidate_tags(f'post:{pk}')
+            processed += 1
+        for name in failed:
+            self.stdout.write(
+                self.style.WARNING(f'Не удалось прочитать {name}'))
+        self.stdout.write(
+            self.style.SUCCESS(f'Обработано изображений: {processed}'))
@@ -0,0 +1,105 @@
+import random
+import re
+import time
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image, ImageDraw, ImageFilter, ImageOps
+
+from blog.images import encode_webp, webp_enabled
+
+EXTENSIONS = ('.jpg', '.jpeg', '.png')
+SAMPLE_SIZE = (1600, 1200)
+# уменьшенные копии a.w320.jpg созданы из оригиналов и в замер не входят,
+# WebP-копии отсеиваются по расширению
+DERIVATIVE_NAME = re.compile(r'\.w\d+\.')
+
+
+def sample_corpus(count, seed=0):
+    """
+    Синтетические «фотографии» и «скриншоты»: градиент с размытыми
+    фигурами и шумом в JPEG и плоские цветные блоки в PNG.
+    """
+    rng = random.Random(seed)
+    for number in range(count):
+        image = Image.linear_gradient('L').resize(SAMPLE_SIZE).convert('RGB')
+        image = ImageOps.colorize(
+            image.convert('L'),
+            tuple(rng.randrange(256) for _ in range(3)),
+            tuple(rng.randrange(256) for _ in range(3)))
+        draw = ImageDraw.Draw(image)
+        for _ in range(40):
+            x, y = rng.randrange(SAMPLE_SIZE[0]), rng.randrange(SAMPLE_SIZE[1])
+            radius = rng.randrange(20, 200)
+            draw.ellipse(
+                (x - radius, y - radius, x + radius, y + radius),
+                fill=tuple(rng.randrange(256) for _ in range(3)))
+        buffer = BytesIO()
+        if number % 2:
+            image.quantize(16).save(buffer, 'PNG', optimize=True)
+            yield f'sample-{number}.png', buffer.getvalue()
+        else:
+            image = image.filter(ImageFilter.GaussianBlur(3))
+            noise = Image.effect_noise(SAMPLE_SIZE, 24).convert('RGB')
+            Image.blend(image, noise, 0.1).save(buffer, 'JPEG', quality=90)
+            yield f'sample-{number}.jpg', buffer.getvalue()
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает размер изображений JPEG и PNG с их WebP-копиями '
+        'и выводит сэкономленные байты.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', default=None,
+            help='Каталог с изображениями, по умолчанию MEDIA_ROOT/image.')
+        parser.add_argument(
+            '--sample', type=int, default=0,
+            help='Вместо каталога сжать N синтетических изображений.')
+
+    def get_corpus(self, options):
+        if options['sample']:
+            return sample_corpus(options['sample'])
+        path = Path(options['path'] or Path(settings.MEDIA_ROOT) / 'image')
+        if not path.is_dir():
+            raise CommandError(f'Каталог {path} не найден')
+        # хранилище раскладывает файлы по подкаталогам: image/3a/3a7b….jpg
+        return (
+            (str(file.relative_to(path)), file.read_bytes())
+            for file in sorted(path.rglob('*'))
+            if file.suffix.lower() in EXTENSIONS
+            and not DERIVATIVE_NAME.search(file.name)
+        )
+
+    def handle(self, *args, **options):
+        if not webp_enabled():
+            raise CommandError('Pillow собран без поддержки WebP')
+        total_original = total_webp = count = 0
+        for name, data in self.get_corpus(options):
+            started = time.perf_counter()
+            with Image.open(BytesIO(data)) as image:
+                webp = encode_webp(
+                    ImageOps.exif_transpose(image), image.format)
+            elapsed = time.perf_counter() - started
+            count += 1
+            total_original += len(data)
+            # копия не меньше оригинала не сохраняется и не отдаётся
+            total_webp += min(webp.size, len(data))
+            note = '' if webp.size < len(data) else ', отдаётся оригинал'
+            self.stdout.write(
+                f'{name}: {len(data)} → {webp.size} байт '
+                f'({_percent(len(data) - webp.size, len(data))}{note}), '
+                f'{elapsed * 1000:.0f} мс')
+        saved = total_original - total_webp
+        self.stdout.write(self.style.SUCCESS(
+            f'Изображений: {count}, исходный размер: {total_original} байт, '
+            f'WebP: {total_webp} байт, сэкономлено: {saved} байт '
+            f'({_percent(saved, total_original)})'))
+
+
+def _percent(part, total):
+    return f'{part / total:.1%}' if total else '—'
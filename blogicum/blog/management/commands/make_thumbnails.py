@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from blog.cache import invalidate_tags
+from blog.images import make_thumbnails
+from blog.jobs import store_image_info
+from blog.models import Post
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт уменьшенные копии изображений публикаций и сохраняет '
+        'их список в БД.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересоздать уже существующие уменьшенные копии.')
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Количество публикаций, обрабатываемых за один запрос.')
+
+    def handle(self, *args, **options):
+        processed = 0
+        failed = []
+        posts = Post.objects.exclude(image='').only('id', 'image')
+        for post in posts.iterator(chunk_size=options['batch_size']):
+            info = make_thumbnails(post.image, force=options['force'])
+            store_image_info(post.pk, post.image.name, info)
+            # обновление без сигналов, страницы поста сбрасываются явно
+            invalidate_tags(f'post:{post.pk}')
+            if info is None:
+                failed.append(post.image.name)
+            else:
+                processed += 1
+        for name in failed:
+            self.stdout.write(
+                self.style.WARNING(f'Не удалось прочитать {name}'))
+        self.stdout.write(
+            self.style.SUCCESS(f'Обработано изображений: {processed}'))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from blog.models import Comment, Post
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики комментариев у публикаций.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Количество публикаций, обрабатываемых за один запрос.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        counts = Comment.objects.filter(
+            post=OuterRef('pk')
+        ).order_by().values('post').annotate(total=Count('pk')).values('total')
+        actual_count = Coalesce(Subquery(counts), 0)
+        last_pk = 0
+        fixed = 0
+        while True:
+            pks = list(
+                Post.objects.filter(pk__gt=last_pk)
+                .order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not pks:
+                break
+            last_pk = pks[-1]
+            # счётчик считается и записывается одним UPDATE, поэтому
+            # комментарии, добавленные во время пересчёта, не теряются
+            fixed += Post.objects.filter(pk__in=pks).exclude(
+                comment_count=actual_count,
+            ).update(comment_count=actual_count)
+        self.stdout.write(
+            self.style.SUCCESS(f'Исправлено счётчиков: {fixed}'))
@@ -0,0 +1,76 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from blog.jobs import (claim_jobs, requeue_stale_jobs, run_image_job,
+                       run_image_job_in_worker)
+
+POLL_INTERVAL = 1
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет задачи фоновой обработки изображений из очереди в БД '
+        'в пуле процессов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Количество процессов; 0 — выполнять задачи '
+                 'в текущем процессе.')
+        parser.add_argument(
+            '--poll-interval', type=float, default=POLL_INTERVAL,
+            help='Пауза между проверками пустой очереди, секунды.')
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить задачи из очереди и завершиться.')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        if workers < 1:
+            self.run(
+                lambda pks: [lambda pk=pk: run_image_job(pk) for pk in pks],
+                1, options)
+            return
+        # дочерние процессы не должны наследовать подключения к БД
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            self.run(
+                lambda pks: [
+                    executor.submit(run_image_job_in_worker, pk).result
+                    for pk in pks],
+                workers, options)
+
+    def run(self, run_many, batch_size, options):
+        """
+        run_many запускает задачи и возвращает для каждой функцию,
+        которая ждёт её результата.
+        """
+        done = 0
+        requeue_stale_jobs()
+        try:
+            while True:
+                pks = claim_jobs(batch_size)
+                if not pks:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    requeue_stale_jobs()
+                    continue
+                for pk, result in zip(pks, run_many(pks)):
+                    try:
+                        status = result()
+                    except Exception as error:
+                        # ошибка одной задачи не останавливает исполнителей;
+                        # зависшую задачу вернёт requeue_stale_jobs
+                        self.stderr.write(f'Задача {pk}: {error!r}')
+                        continue
+                    done += 1
+                    self.stdout.write(f'Задача {pk}: {status}')
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Выполнено задач: {done}'))
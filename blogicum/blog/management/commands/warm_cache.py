@@ -0,0 +1,111 @@
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+
+from blog.models import Category, Post
+from blog.views import CategoryPost
+
+CATEGORY_PAGES = 3
+RECENT_POSTS = 20
+WORKERS = 4
+STATIC_PAGES = ('pages:about', 'pages:rules')
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогревает кэш: рендерит главную страницу, первые страницы '
+        'опубликованных категорий, последние публикации и статические '
+        'страницы.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--category-pages', type=int, default=CATEGORY_PAGES,
+            help='Сколько первых страниц каждой категории рендерить.')
+        parser.add_argument(
+            '--posts', type=int, default=RECENT_POSTS,
+            help='Сколько последних публикаций рендерить.')
+        parser.add_argument(
+            '--workers', type=int, default=WORKERS,
+            help='Количество потоков.')
+        parser.add_argument(
+            '--host', default=None,
+            help='Имя хоста в запросах, по умолчанию первое '
+                 'из ALLOWED_HOSTS.')
+
+    def get_urls(self, category_pages, posts):
+        urls = [reverse('blog:index')]
+        post_counts = dict(
+            Post.objects.published().order_by()
+            .values_list('category').annotate(count=Count('id')))
+        categories = Category.objects.filter(
+            is_published=True).order_by('pk')
+        for category in categories:
+            url = reverse('blog:category_posts', args=[category.slug])
+            num_pages = math.ceil(
+                post_counts.get(category.pk, 0) / CategoryPost.paginate_by)
+            urls.append(url)
+            urls.extend(
+                f'{url}?page={number}'
+                for number in range(2, min(num_pages, category_pages) + 1))
+        urls.extend(
+            reverse('blog:detail', args=[pk])
+            for pk in Post.objects.published().values_list(
+                'pk', flat=True)[:posts])
+        urls.extend(reverse(name) for name in STATIC_PAGES)
+        return urls
+
+    def get_host(self):
+        for host in settings.ALLOWED_HOSTS:
+            host = host.lstrip('.')
+            if host and host != '*':
+                return host
+        return 'localhost'
+
+    def render(self, url, host):
+        # у каждого потока свой клиент и своё подключение к БД
+        client = Client(HTTP_HOST=host, raise_request_exception=False)
+        started = time.perf_counter()
+        try:
+            status = client.get(url).status_code
+        finally:
+            connections.close_all()
+        return url, status, time.perf_counter() - started
+
+    def handle(self, *args, **options):
+        if not getattr(settings, 'BLOG_PAGE_CACHE', False):
+            self.stdout.write(self.style.WARNING(
+                'Кэширование страниц выключено настройкой BLOG_PAGE_CACHE.'))
+            return
+        if isinstance(caches['default'], LocMemCache):
+            self.stdout.write(self.style.WARNING(
+                'Кэш LocMemCache у каждого процесса свой: страницы, '
+                'прогретые командой, сервер не увидит.'))
+        host = options['host'] or self.get_host()
+        urls = self.get_urls(options['category_pages'], options['posts'])
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            results = list(executor.map(
+                lambda url: self.render(url, host), urls))
+        failed = 0
+        for url, status, elapsed in results:
+            line = f'{status} {elapsed * 1000:8.1f} мс  {url}'
+            if status == 200:
+                self.stdout.write(line)
+            else:
+                failed += 1
+                self.stdout.write(self.style.ERROR(line))
+        summary = (
+            f'Прогрето страниц: {len(results) - failed} из {len(results)} '
+            f'за {time.perf_counter() - started:.2f} с')
+        style = self.style.ERROR if failed else self.style.SUCCESS
+        self.stdout.write(style(summary))
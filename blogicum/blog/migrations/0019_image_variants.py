@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-18 06:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0018_image_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_variants',
+            field=models.JSONField(blank=True, editable=False, help_text='Ширины созданных уменьшенных и WebP-копий; пусто, пока изображение не обработано.', null=True, verbose_name='Копии изображения'),
+        ),
+    ]
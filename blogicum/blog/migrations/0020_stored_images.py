@@ -0,0 +1,37 @@
+# Generated by Django 3.2.16 on 2026-10-18 06:17
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_references(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    StoredImage = apps.get_model('blog', 'StoredImage')
+    references = Post.objects.exclude(image='').order_by().values(
+        'image').annotate(total=Count('pk')).values_list('image', 'total')
+    StoredImage.objects.bulk_create(
+        StoredImage(name=name, references=total)
+        for name, total in references.iterator())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0019_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Файл')),
+                ('references', models.PositiveIntegerField(default=0, verbose_name='Ссылки')),
+            ],
+            options={
+                'verbose_name': 'файл изображения',
+                'verbose_name_plural': 'Файлы изображений',
+            },
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.2.16 on 2026-10-18 06:31
+
+import blog.models
+import blog.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0020_stored_images'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, storage=blog.storage.ContentAddressedStorage(), upload_to=blog.models.post_image_path, verbose_name='Изображение'),
+        ),
+    ]
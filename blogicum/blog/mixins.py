@@ -0,0 +1,312 @@
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.paginator import Paginator
+from django.db import connections
+from django.http import Http404, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from .cache import (PAGE_CACHE_TIMEOUT, CacheLock, get_cached_page,
+                    get_page_tags, get_tag_versions, page_cache_key,
+                    page_validators, release_scheduled_posts,
+                    set_cached_page, set_page_tags, wait_for)
+from .holes import fill_holes
+from .paginators import (CachedCountPaginator, CursorPaginator,
+                         HasNextPaginator, InvalidCursor)
+
+
+class ElidedPageRangeMixin:
+    """
+    Передаёт в шаблон сокращённый список страниц:
+    первую, последнюю и несколько страниц вокруг текущей.
+    """
+    pages_on_each_side = 2
+    pages_on_ends = 1
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        page = context.get('page_obj')
+        paginator = context.get('paginator')
+        if isinstance(paginator, Paginator) and not getattr(
+                paginator, 'count_free', False) and page is not None:
+            context['page_range'] = paginator.get_elided_page_range(
+                page.number,
+                on_each_side=self.pages_on_each_side,
+                on_ends=self.pages_on_ends)
+        return context
+
+
+class CachedCountMixin:
+    """
+    Пагинация с закэшированным числом записей.
+    При BLOG_PAGINATOR_HAS_NEXT_ONLY число записей не считается вовсе.
+    """
+
+    def get_count_cache_key(self):
+        kwargs = ':'.join(
+            f'{key}={value}' for key, value in sorted(self.kwargs.items()))
+        return f'{self.request.resolver_match.view_name}:{kwargs}'
+
+    def get_paginator(self, queryset, per_page, orphans=0,
+                      allow_empty_first_page=True, **kwargs):
+        if getattr(settings, 'BLOG_PAGINATOR_HAS_NEXT_ONLY', False):
+            return HasNextPaginator(
+                queryset, per_page, orphans=orphans,
+                allow_empty_first_page=allow_empty_first_page, **kwargs)
+        return CachedCountPaginator(
+            queryset, per_page, orphans=orphans,
+            allow_empty_first_page=allow_empty_first_page,
+            cache_key=self.get_count_cache_key(), **kwargs)
+
+
+class CursorPaginationMixin:
+    """
+    Курсорная пагинация для лент публикаций.
+    Включается настройкой BLOG_CURSOR_PAGINATION или параметром ?cursor=,
+    ссылки вида ?page= продолжают работать через обычный пагинатор.
+    """
+    cursor_kwarg = 'cursor'
+
+    def use_cursor_pagination(self):
+        params = self.request.GET
+        if self.cursor_kwarg in params:
+            return True
+        return (getattr(settings, 'BLOG_CURSOR_PAGINATION', False)
+                and self.page_kwarg not in params)
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.use_cursor_pagination():
+            return super().paginate_queryset(queryset, page_size)
+        paginator = CursorPaginator(queryset, page_size)
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except InvalidCursor as error:
+            raise Http404(str(error))
+        return paginator, page, page.object_list, page.has_other_pages()
+
+
+class PageCacheMixin:
+    """
+    Кэширует страницы целиком.
+    Страница помечается тегами выведенных на ней объектов
+    и сбрасывается сигналами при их изменении. Персональные части
+    страницы в кэш не попадают и подставляются для каждого запроса.
+    Без кэша страниц запоминаются только теги: ETag и Last-Modified
+    вычисляются по их версиям, и ответ 304 отдаётся без рендеринга.
+    """
+
+    use_page_cache = False
+
+    def get_base_cache_tags(self):
+        """Теги, известные до рендеринга страницы."""
+        return set()
+
+    def get_cache_tags(self, context):
+        """Теги объектов, выведенных на странице."""
+        return set()
+
+    def get_hole_context(self):
+        """Контекст для рендеринга персональных частей страницы."""
+        return {}
+
+    def is_shared_page(self, context):
+        """Можно ли показывать страницу всем пользователям."""
+        return True
+
+    def can_cache_request(self, request):
+        return (getattr(settings, 'BLOG_PAGE_CACHE', False)
+                and request.method in ('GET', 'HEAD'))
+
+    def can_cache_response(self, request, response):
+        # страницы с CSRF-токеном и персональными заголовками не кэшируются
+        return (response.status_code == 200
+                and not response.cookies
+                and not request.META.get('CSRF_COOKIE_USED')
+                and 'private' not in response.get('Cache-Control', ''))
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # персональные части вырезаются, только если страница кэшируется
+        context['punch_holes'] = self.use_page_cache
+        return context
+
+    def fill_holes(self, content):
+        return fill_holes(content, self.request, self.get_hole_context())
+
+    def get_validators(self, versions):
+        etag, last_modified = page_validators(versions, self.request.user)
+        if self.request.user.is_authenticated:
+            # время изменения не учитывает смену пользователя,
+            # персональные страницы проверяются только по ETag
+            last_modified = None
+        return etag, last_modified
+
+    def set_validators(self, response, etag, last_modified):
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def get_page_cache_timeouts(self):
+        """
+        Мягкое и жёсткое время жизни страницы в кэше.
+        После мягкого страница отдаётся устаревшей и перестраивается в фоне,
+        после жёсткого удаляется. Мягкое время None — без фонового
+        обновления. Задаются по имени URL в
+        BLOG_PAGE_CACHE_STALE_WHILE_REVALIDATE.
+        """
+        hard = getattr(settings, 'BLOG_PAGE_CACHE_TIMEOUT', PAGE_CACHE_TIMEOUT)
+        match = self.request.resolver_match
+        timeouts = getattr(
+            settings, 'BLOG_PAGE_CACHE_STALE_WHILE_REVALIDATE', {}
+        ).get(match and match.url_name)
+        return timeouts or (None, hard)
+
+    def set_cache_control(self, response):
+        soft, hard = self.get_page_cache_timeouts()
+        if soft is not None:
+            # прокси отдаёт устаревшую страницу так же, как и этот кэш
+            patch_cache_control(
+                response, max_age=soft, stale_while_revalidate=hard - soft)
+            if self.request.user.is_authenticated:
+                patch_cache_control(response, private=True)
+            else:
+                patch_cache_control(response, public=True)
+        return response
+
+    def cached_response(self, entry):
+        etag, last_modified = self.get_validators(entry['tags'])
+        response = get_conditional_response(
+            self.request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = HttpResponse(
+                self.fill_holes(entry['content']),
+                content_type=entry['content_type'])
+        self.set_cache_control(response)
+        return self.set_validators(response, etag, last_modified)
+
+    def is_expired(self, entry):
+        soft, _ = self.get_page_cache_timeouts()
+        return (soft is not None
+                and time.time() - entry.get('created', 0) > soft)
+
+    def revalidate(self, key, *args, **kwargs):
+        """
+        Перестраивает устаревшую по времени страницу в фоновом потоке.
+        Страница рендерится для анонимного пользователя: персональные
+        части в кэш всё равно не попадают.
+        """
+        lock = CacheLock(key)
+        if not lock.acquire():
+            return
+        request = copy.copy(self.request)
+        request.META = request.META.copy()
+        request.user = AnonymousUser()
+        view = type(self)()
+        view.setup(request, *args, **kwargs)
+        view.use_page_cache = True
+
+        def run():
+            try:
+                response = view.build_page(key, lock, request, *args, **kwargs)
+                if hasattr(response, 'render'):
+                    response.render()
+            finally:
+                lock.release()
+                connections.close_all()
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def dispatch(self, request, *args, **kwargs):
+        self.use_page_cache = self.can_cache_request(request)
+        if not self.use_page_cache:
+            if request.method not in ('GET', 'HEAD'):
+                return super().dispatch(request, *args, **kwargs)
+            return self.conditional_dispatch(request, *args, **kwargs)
+        # отложенные посты появляются без сохранения в БД,
+        # поэтому их ленты сбрасываются по наступлении времени публикации
+        release_scheduled_posts()
+        key = page_cache_key(request)
+        entry = get_cached_page(key, stale=True)
+        if entry is not None and not entry['stale']:
+            if self.is_expired(entry):
+                self.revalidate(key, *args, **kwargs)
+            return self.cached_response(entry)
+        lock = CacheLock(key)
+        if not lock.acquire():
+            # страницу уже строит другой процесс: отдаём устаревшую
+            # или ждём новую, чтобы не нагружать БД одинаковыми запросами
+            entry = entry or wait_for(lambda: get_cached_page(key))
+            if entry is not None:
+                return self.cached_response(entry)
+        return self.build_page(key, lock, request, *args, **kwargs)
+
+    def conditional_dispatch(self, request, *args, **kwargs):
+        """
+        Отвечает на условный запрос по тегам, запомненным при прошлом
+        рендеринге страницы, и рендерит её, только если теги изменились.
+        """
+        conditional = ('HTTP_IF_NONE_MATCH' in request.META
+                       or 'HTTP_IF_MODIFIED_SINCE' in request.META)
+        tags = get_page_tags(request) if conditional else None
+        if tags is not None:
+            # отложенные посты появляются без сохранения в БД
+            release_scheduled_posts()
+            etag, last_modified = self.get_validators(get_tag_versions(tags))
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified)
+            if response is not None:
+                return self.set_validators(response, etag, last_modified)
+        versions = get_tag_versions(self.get_base_cache_tags())
+        response = super().dispatch(request, *args, **kwargs)
+
+        def validate(response):
+            if response.status_code != 200:
+                return None
+            versions.update(get_tag_versions(
+                self.get_cache_tags(response.context_data) - set(versions)))
+            set_page_tags(request, versions)
+            etag, last_modified = self.get_validators(versions)
+            self.set_validators(response, etag, last_modified)
+            return get_conditional_response(
+                request, etag=etag, last_modified=last_modified,
+                response=response)
+
+        if hasattr(response, 'add_post_render_callback'):
+            response.add_post_render_callback(validate)
+        return response
+
+    def build_page(self, key, lock, request, *args, **kwargs):
+        """Рендерит страницу и кэширует её, снимая блокировку."""
+        try:
+            versions = get_tag_versions(self.get_base_cache_tags())
+            response = super().dispatch(request, *args, **kwargs)
+        except BaseException:
+            lock.release()
+            raise
+
+        def store(response):
+            try:
+                if (self.can_cache_response(request, response)
+                        and self.is_shared_page(response.context_data)):
+                    stored_versions = set_cached_page(
+                        key, response,
+                        self.get_cache_tags(response.context_data), versions,
+                        timeout=self.get_page_cache_timeouts()[1])
+                    self.set_validators(
+                        response, *self.get_validators(stored_versions))
+                    self.set_cache_control(response)
+            finally:
+                lock.release()
+            response.content = self.fill_holes(
+                response.content.decode(response.charset))
+
+        if hasattr(response, 'add_post_render_callback'):
+            response.add_post_render_callback(store)
+        else:
+            lock.release()
+        return response
@@ -1,10 +1,32 @@
+import posixpath
+from datetime import timedelta
+
+from django.conf import settings
 from django.db import models
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth.models import User
 
+from .storage import image_storage
+
 
 LENGTH_TITLE = 10
 LENGTH_NAME = 10
+VISIBILITY_BUCKET = 60
+
+
+def visibility_now():
+    """
+    Текущее время для фильтров видимости постов.
+    Округляется вниз до BLOG_VISIBILITY_BUCKET секунд, поэтому в пределах
+    интервала одинаковые запросы дают одинаковый SQL.
+    """
+    now = timezone.now()
+    bucket = getattr(settings, 'BLOG_VISIBILITY_BUCKET', VISIBILITY_BUCKET)
+    if not bucket:
+        return now
+    return now.replace(microsecond=0) - timedelta(
+        seconds=int(now.timestamp()) % bucket)
 
 
 class BaseModel(models.Model):
@@ -52,6 +74,38 @@ class Location(BaseModel):
         return self.name[:LENGTH_NAME]
 
 
+class PostQuerySet(models.QuerySet):
+    """Набор запросов для постов."""
+
+    def with_related(self):
+        """Подгружает автора, категорию и местоположение одним запросом."""
+        return self.select_related('author', 'category', 'location')
+
+    def published(self):
+        """Опубликованные посты с опубликованной категорией."""
+        return self.with_related().filter(
+            is_published=True,
+            pub_date__lte=visibility_now(),
+            category__is_published=True)
+
+    def scheduled(self):
+        """Отложенные посты, которые появятся в лентах позже."""
+        return self.filter(
+            is_published=True,
+            pub_date__gt=visibility_now(),
+            category__is_published=True)
+
+
+def post_image_path(instance, filename):
+    """
+    Путь загруженного изображения поста.
+    Отмечает пост, получивший новую загрузку: одинаковое содержимое
+    хранится под прежним именем, и по имени загрузку не отличить.
+    """
+    instance._image_uploaded = True
+    return posixpath.join('image', filename)
+
+
 class Post(BaseModel):
     title = models.CharField(
         'Заголовок', max_length=256)
@@ -71,17 +125,49 @@ class Post(BaseModel):
         null=True, verbose_name='Категория')
     image = models.ImageField(
         'Изображение',
-        upload_to='image',
+        upload_to=post_image_path,
+        storage=image_storage,
         blank=True)
+    # размеры и заглушка хранятся в БД, чтобы шаблоны не читали файл;
+    # width_field/height_field не используются: с ними Django открывает
+    # файл при создании каждого объекта, у которого размеры не заполнены
+    image_width = models.PositiveIntegerField(
+        'Ширина изображения', null=True, blank=True, editable=False)
+    image_height = models.PositiveIntegerField(
+        'Высота изображения', null=True, blank=True, editable=False)
+    image_placeholder = models.TextField(
+        'Заглушка изображения', blank=True, editable=False,
+        help_text='Размытая уменьшенная копия в виде data URI.')
+    image_variants = models.JSONField(
+        'Копии изображения', null=True, blank=True, editable=False,
+        help_text='Ширины созданных уменьшенных и WebP-копий; '
+                  'пусто, пока изображение не обработано.')
+    comment_count = models.PositiveIntegerField(
+        'Количество комментариев', default=0, editable=False)
+    image_pending = models.BooleanField(
+        'Изображение обрабатывается', default=False, editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'публикация'
         verbose_name_plural = 'Публикации'
-
-    @property
-    def comment_count(self):
-        return self.comments.count()
+        indexes = (
+            # условие индекса совпадает с фильтром is_published=True,
+            # который Django передаёт в SQL без сравнения с константой
+            models.Index(
+                fields=('pub_date',),
+                condition=models.Q(is_published=True),
+                name='post_published_idx'),
+            models.Index(
+                fields=('category', 'pub_date'),
+                condition=models.Q(is_published=True),
+                name='post_category_published_idx'),
+            models.Index(
+                fields=('author', 'pub_date'),
+                name='post_author_pub_date_idx'),
+        )
 
     def __str__(self):
         return self.title[:LENGTH_TITLE]
@@ -109,9 +195,70 @@ class Comment(models.Model):
         ordering = ('created_at',)
         verbose_name = 'комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = (
+            models.Index(
+                fields=('post', 'created_at'),
+                name='comment_post_created_idx'),
+        )
 
     def __str__(self):
         return self.text
 
     def get_absolute_url(self):
         return reverse('blog:detail', args=[str(self.id)])
+
+
+class ImageJob(models.Model):
+    """Задача фоновой обработки изображения публикации."""
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    )
+
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE,
+        related_name='image_jobs',
+        verbose_name='Публикация')
+    image = models.CharField('Изображение', max_length=255)
+    status = models.CharField(
+        'Статус', max_length=16, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField('Попытки', default=0)
+    error = models.TextField('Ошибка', blank=True)
+    created_at = models.DateTimeField('Добавлено', auto_now_add=True)
+    started_at = models.DateTimeField('Начата', null=True, blank=True)
+
+    class Meta:
+        ordering = ('created_at',)
+        verbose_name = 'обработка изображения'
+        verbose_name_plural = 'Обработка изображений'
+        indexes = (
+            models.Index(
+                fields=('status', 'created_at'),
+                name='image_job_status_idx'),
+        )
+
+    def __str__(self):
+        return f'{self.image} ({self.get_status_display()})'
+
+
+class StoredImage(models.Model):
+    """
+    Файл хранилища изображений по содержимому и число постов,
+    которые на него ссылаются. Файл удаляется вместе с последней ссылкой.
+    """
+    name = models.CharField('Файл', max_length=255, unique=True)
+    references = models.PositiveIntegerField('Ссылки', default=0)
+
+    class Meta:
+        verbose_name = 'файл изображения'
+        verbose_name_plural = 'Файлы изображений'
+
+    def __str__(self):
+        return f'{self.name} ({self.references})'
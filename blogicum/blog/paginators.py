@@ -0,0 +1,205 @@
+from collections.abc import Sequence
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import (EmptyPage, Page, PageNotAnInteger,
+                                   Paginator)
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_str
+from django.utils.functional import cached_property
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+COUNT_CACHE_PREFIX = 'blog:paginator:count'
+COUNT_VERSION_KEY = 'blog:paginator:version'
+COUNT_CACHE_TIMEOUT = 60
+
+
+def get_count_version():
+    """Текущее поколение закэшированных счётчиков пагинатора."""
+    version = cache.get(COUNT_VERSION_KEY)
+    if version is None:
+        cache.add(COUNT_VERSION_KEY, 1, timeout=None)
+        version = cache.get(COUNT_VERSION_KEY, 1)
+    return version
+
+
+def invalidate_counts():
+    """Сбрасывает все закэшированные счётчики пагинатора."""
+    try:
+        cache.incr(COUNT_VERSION_KEY)
+    except ValueError:
+        cache.add(COUNT_VERSION_KEY, 1, timeout=None)
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Пагинатор, кэширующий число записей.
+    Ключ задаёт представление (страница и её фильтр), время жизни —
+    настройка BLOG_PAGINATOR_COUNT_TIMEOUT.
+    """
+
+    def __init__(self, *args, cache_key=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_key = cache_key
+
+    @cached_property
+    def count(self):
+        if self.cache_key is None:
+            return super().count
+        key = f'{COUNT_CACHE_PREFIX}:{get_count_version()}:{self.cache_key}'
+        count = cache.get(key)
+        if count is None:
+            count = super().count
+            cache.set(key, count, getattr(
+                settings, 'BLOG_PAGINATOR_COUNT_TIMEOUT',
+                COUNT_CACHE_TIMEOUT))
+        return count
+
+
+class HasNextPage(Page):
+    """Страница, которая знает о следующей странице без подсчёта записей."""
+
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+
+class HasNextPaginator(Paginator):
+    """
+    Пагинатор без SELECT COUNT(*).
+    Выбирает на одну запись больше размера страницы,
+    чтобы узнать, есть ли следующая страница.
+    """
+    count_free = True
+
+    def validate_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('Номер страницы не является целым числом')
+        if number < 1:
+            raise EmptyPage('Номер страницы меньше 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        objects = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not objects and number > 1:
+            raise EmptyPage('На этой странице нет результатов')
+        return HasNextPage(
+            objects[:self.per_page], number, self,
+            has_next=len(objects) > self.per_page)
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorPage(Sequence):
+    """
+    Страница курсорной пагинации.
+    Вместо номеров страниц хранит курсоры соседних страниц.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f'<CursorPage of {len(self.object_list)} items>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @property
+    def next_cursor(self):
+        if not self.has_next():
+            return None
+        return self.paginator.encode_cursor(NEXT, self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous():
+            return None
+        return self.paginator.encode_cursor(PREVIOUS, self.object_list[0])
+
+
+class CursorPaginator:
+    """
+    Курсорная (keyset) пагинация по паре (pub_date, id).
+    Страница выбирается условием по ключу сортировки, а не OFFSET,
+    и не требует подсчёта общего числа записей.
+    """
+
+    def __init__(self, object_list, per_page):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+
+    def encode_cursor(self, direction, obj):
+        value = f'{direction}|{obj.pub_date.isoformat()}|{obj.pk}'
+        return urlsafe_base64_encode(value.encode())
+
+    def decode_cursor(self, cursor):
+        try:
+            direction, pub_date, pk = force_str(
+                urlsafe_base64_decode(cursor)).split('|')
+            pub_date = parse_datetime(pub_date)
+            pk = int(pk)
+        except (TypeError, ValueError):
+            raise InvalidCursor('Некорректный курсор')
+        if direction not in (NEXT, PREVIOUS) or pub_date is None:
+            raise InvalidCursor('Некорректный курсор')
+        return direction, pub_date, pk
+
+    def page(self, cursor=None):
+        queryset = self.object_list
+        if not cursor:
+            objects = list(
+                queryset.order_by('-pub_date', '-pk')[:self.per_page + 1])
+            return CursorPage(
+                objects[:self.per_page], self,
+                has_next=len(objects) > self.per_page,
+                has_previous=False)
+
+        direction, pub_date, pk = self.decode_cursor(cursor)
+        if direction == NEXT:
+            objects = list(
+                queryset.filter(pub_date__lte=pub_date)
+                .filter(Q(pub_date__lt=pub_date) | Q(pk__lt=pk))
+                .order_by('-pub_date', '-pk')[:self.per_page + 1])
+            return CursorPage(
+                objects[:self.per_page], self,
+                has_next=len(objects) > self.per_page,
+                has_previous=True)
+
+        objects = list(
+            queryset.filter(pub_date__gte=pub_date)
+            .filter(Q(pub_date__gt=pub_date) | Q(pk__gt=pk))
+            .order_by('pub_date', 'pk')[:self.per_page + 1])
+        return CursorPage(
+            objects[:self.per_page][::-1], self,
+            has_next=True,
+            has_previous=len(objects) > self.per_page)
@@ -0,0 +1,254 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .cache import (PROFILE_FIELDS, forget_profile_user,
+                    forget_scheduled_posts, invalidate_tags, schedule_post)
+from .images import delete_image
+from .jobs import enqueue_image_job
+from .models import Category, Comment, Location, Post, User
+from .paginators import invalidate_counts
+from .storage import delete_unreferenced, remove_reference
+
+
+def invalidate_on_commit(*tags):
+    """
+    Сбрасывает теги после фиксации транзакции: иначе параллельный
+    запрос прочитал бы новые версии тегов и закэшировал под ними
+    страницу с ещё не зафиксированными данными.
+    """
+    transaction.on_commit(lambda: invalidate_tags(*tags))
+
+
+@receiver(pre_save, sender=Comment)
+def remember_comment_post(sender, instance, raw, update_fields, **kwargs):
+    """Запоминает прежний пост комментария, чтобы перенести счётчик."""
+    instance._previous_post_id = None
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and 'post' not in update_fields:
+        return
+    instance._previous_post_id = Comment.objects.filter(
+        pk=instance.pk).values_list('post_id', flat=True).first()
+
+
+@receiver(post_save, sender=Comment)
+def increment_comment_count(sender, instance, created, raw, **kwargs):
+    """
+    Увеличивает счётчик комментариев поста при создании комментария,
+    а при переносе комментария в другой пост переносит и единицу счётчика.
+    """
+    if raw:
+        return
+    previous_post_id = getattr(instance, '_previous_post_id', None)
+    if not created and previous_post_id in (None, instance.post_id):
+        return
+    if previous_post_id is not None:
+        Post.objects.filter(
+            pk=previous_post_id, comment_count__gt=0
+        ).update(comment_count=F('comment_count') - 1)
+    Post.objects.filter(pk=instance.post_id).update(
+        comment_count=F('comment_count') + 1)
+
+
+@receiver(post_delete, sender=Comment)
+def decrement_comment_count(sender, instance, **kwargs):
+    """
+    Уменьшает счётчик комментариев поста при удалении комментария.
+    Срабатывает и при удалении через админку, и при каскадном удалении.
+    """
+    Post.objects.filter(
+        pk=instance.post_id, comment_count__gt=0
+    ).update(comment_count=F('comment_count') - 1)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def reset_paginator_counts(sender, **kwargs):
+    """Сбрасывает закэшированное число постов в лентах."""
+    invalidate_counts()
+
+
+@receiver(post_save, sender=Post)
+def update_scheduled_posts(sender, instance, **kwargs):
+    """Переносит срок ближайшей отложенной публикации."""
+    schedule_post(instance)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def reset_scheduled_posts(sender, **kwargs):
+    """
+    Заново определяет время ближайшей отложенной публикации.
+    Публикация категории открывает её отложенные посты.
+    """
+    forget_scheduled_posts()
+
+
+@receiver(pre_save, sender=User)
+def remember_user_state(sender, instance, raw, update_fields, **kwargs):
+    """
+    Запоминает выводимые на страницах поля пользователя.
+    Сохранение только других полей, например last_login при входе,
+    кэш не сбрасывает, и прежние значения не запрашиваются.
+    """
+    instance._previous_profile = None
+    if raw or instance.pk is None:
+        return
+    fields = [field for field in PROFILE_FIELDS if field != 'id']
+    if update_fields is not None and not set(fields) & set(update_fields):
+        return
+    instance._previous_profile = User.objects.filter(
+        pk=instance.pk).values(*fields).first()
+
+
+@receiver(post_save, sender=User)
+def reset_user_pages(sender, instance, created, **kwargs):
+    """
+    Сбрасывает кэш страниц с именем пользователя и его закэшированные
+    для профиля поля, если выводимые поля пользователя изменились.
+    """
+    previous = getattr(instance, '_previous_profile', None)
+    if created or previous is None:
+        return
+    if all(getattr(instance, field) == value
+           for field, value in previous.items()):
+        return
+    transaction.on_commit(lambda: forget_profile_user(previous['username']))
+    invalidate_on_commit(f'user:{instance.pk}')
+
+
+@receiver(post_delete, sender=User)
+def reset_profile_user(sender, instance, **kwargs):
+    """Удаляет из кэша поля профиля удалённого пользователя."""
+    username = instance.username
+    transaction.on_commit(lambda: forget_profile_user(username))
+    invalidate_on_commit(f'user:{instance.pk}')
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_state(sender, instance, raw, **kwargs):
+    """
+    Запоминает прежнюю категорию поста, чтобы сбросить её страницы,
+    и помечает новое изображение как ожидающее обработки,
+    сохраняя его размеры.
+    """
+    previous = None
+    if instance.pk is not None and not raw:
+        previous = Post.objects.filter(pk=instance.pk).values_list(
+            'category_id', 'image').first()
+    instance._previous_category_id, previous_image = previous or (None, None)
+    instance._previous_image = previous_image
+    if raw:
+        return
+    instance._image_changed = bool(instance.image) and (
+        not instance.image._committed
+        or instance.image.name != previous_image)
+    if instance._image_changed:
+        instance.image_pending = True
+        instance.image_placeholder = ''
+        instance.image_variants = None
+        # размеры читаются из заголовка файла; заглушку и размеры
+        # с учётом ориентации EXIF сохранит задача обработки
+        try:
+            instance.image_width = instance.image.width
+            instance.image_height = instance.image.height
+        except (OSError, TypeError, ValueError):
+            instance.image_width = instance.image_height = None
+    elif not instance.image:
+        instance.image_pending = False
+        instance.image_width = instance.image_height = None
+        instance.image_placeholder = ''
+        instance.image_variants = None
+
+
+@receiver(post_save, sender=Post)
+def enqueue_image_processing(sender, instance, raw, **kwargs):
+    """
+    Ставит новое изображение в очередь обработки.
+    Уменьшенные копии создаёт команда run_workers вне запроса.
+    """
+    if not raw and getattr(instance, '_image_changed', False):
+        enqueue_image_job(instance)
+        instance._image_changed = False
+
+
+def release_image(storage, name):
+    """
+    Снимает ссылку поста на файл изображения и удаляет файл,
+    на который больше не ссылается ни один пост. Удаление выполняется
+    после фиксации транзакции, чтобы не удалить файл, если удаление
+    поста откатится.
+    """
+    remove_reference(name)
+    transaction.on_commit(
+        lambda: delete_unreferenced(name, lambda: delete_image(storage, name)))
+
+
+@receiver(post_save, sender=Post)
+def release_replaced_image(sender, instance, raw, **kwargs):
+    """
+    Освобождает прежнее изображение поста после его замены.
+    Повторная загрузка того же содержимого сохраняется под прежним именем,
+    и хранилище учитывает ещё одну ссылку: пост же ссылается на файл
+    по-прежнему один раз, поэтому лишняя ссылка снимается.
+    """
+    previous_image = getattr(instance, '_previous_image', None)
+    # отметку ставит post_image_path при сохранении загруженного файла
+    uploaded = instance.__dict__.pop('_image_uploaded', False)
+    if not raw and previous_image:
+        if previous_image != instance.image.name:
+            release_image(instance.image.storage, previous_image)
+        elif uploaded:
+            remove_reference(previous_image)
+    instance._previous_image = instance.image.name
+
+
+@receiver(post_delete, sender=Post)
+def release_post_image(sender, instance, **kwargs):
+    """Освобождает изображение удалённого поста."""
+    if instance.image:
+        release_image(instance.image.storage, instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def reset_post_pages(sender, instance, **kwargs):
+    """Сбрасывает кэш страниц, на которых выводится пост."""
+    category_ids = {
+        instance.category_id,
+        getattr(instance, '_previous_category_id', None),
+    } - {None}
+    invalidate_on_commit(
+        f'post:{instance.pk}', 'feed', f'profile-posts:{instance.author_id}',
+        *(f'category-posts:{pk}' for pk in category_ids))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def reset_comment_pages(sender, instance, **kwargs):
+    """Сбрасывает кэш страниц поста при изменении комментариев к нему."""
+    post_ids = {
+        instance.post_id, getattr(instance, '_previous_post_id', None),
+    } - {None}
+    invalidate_on_commit(*(f'post:{pk}' for pk in post_ids))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def reset_category_pages(sender, instance, **kwargs):
+    """
+    Сбрасывает кэш страниц категории.
+    Снятие категории с публикации меняет и ленту.
+    """
+    invalidate_on_commit(f'category:{instance.pk}', 'feed')
+
+
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+def reset_location_pages(sender, instance, **kwargs):
+    """Сбрасывает кэш страниц с постами из местоположения."""
+    invalidate_on_commit(f'location:{instance.pk}')
@@ -0,0 +1,109 @@
+import hashlib
+import posixpath
+
+from django.apps import apps
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .images import strip_metadata
+
+
+def _stored_images():
+    # модели импортируют хранилище, поэтому модель берётся из реестра
+    return apps.get_model('blog', 'StoredImage').objects
+
+
+def add_reference(name):
+    """Увеличивает число ссылок на файл."""
+    stored_images = _stored_images()
+    while not stored_images.filter(name=name).update(
+            references=F('references') + 1):
+        try:
+            with transaction.atomic():
+                stored_images.create(name=name, references=1)
+            return
+        except IntegrityError:
+            # запись создал параллельный запрос
+            continue
+
+
+def remove_reference(name):
+    """Уменьшает число ссылок на файл."""
+    _stored_images().filter(name=name, references__gt=0).update(
+        references=F('references') - 1)
+
+
+def delete_unreferenced(name, delete):
+    """
+    Удаляет файл без ссылок функцией delete.
+    Запись о файле удаляется в одной транзакции с файлом, поэтому
+    параллельная загрузка того же содержимого ждёт её завершения
+    и сохраняет файл заново.
+    """
+    with transaction.atomic():
+        deleted, _ = _stored_images().select_for_update().filter(
+            name=name, references=0).delete()
+        if deleted:
+            delete()
+    return bool(deleted)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище, в котором имя файла — хэш его содержимого:
+    image/photo.jpg → image/3a/3a7bd3e2…9c.jpg.
+
+    Одинаковые загрузки хранятся одним файлом, а содержимое файла под
+    одним именем никогда не меняется, поэтому веб-сервер может отдавать
+    его с Cache-Control: immutable. Файл может использоваться несколькими
+    постами: число ссылок хранится в StoredImage, файл удаляется вместе
+    с последней ссылкой (см. release_image в сигналах).
+
+    Из загруженных JPEG и PNG удаляются метаданные, в том числе
+    координаты съёмки: оригинал отдаётся посетителям как есть.
+
+    Производные копии изображений сохраняются методом save_derivative
+    под именем, образованным от имени оригинала.
+    """
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        ext = posixpath.splitext(name)[1].lower()
+        return posixpath.join(
+            posixpath.dirname(name), digest[:2], f'{digest}{ext}')
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        # метаданные удаляются до хэширования: одинаковые снимки
+        # с разными EXIF хранятся одним файлом
+        content = ContentFile(
+            strip_metadata(b''.join(content.chunks())), name=content.name)
+        name = self.hashed_name(name, content)
+        # ссылка учитывается до проверки файла: удаление файла без ссылок
+        # не удалит файл, который загрузка сочла существующим
+        add_reference(name)
+        if self.exists(name):
+            # такой файл уже загружен
+            return name
+        saved = super().save(name, content, max_length)
+        if saved != name:
+            # при одновременной загрузке одинаковых файлов второй получает
+            # имя с суффиксом: лишняя копия, но не потерянный файл
+            add_reference(saved)
+            remove_reference(name)
+        return saved
+
+    def save_derivative(self, name, content, max_length=None):
+        """Сохраняет файл под именем name, не вычисляя хэш."""
+        return super().save(name, content, max_length)
+
+
+image_storage = ContentAddressedStorage()
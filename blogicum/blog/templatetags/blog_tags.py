@@ -0,0 +1,59 @@
+from django import template
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from blog.cache import get_post_card
+from blog.holes import make_hole
+from blog.images import image_sources
+from blog.jobs import request_image_job
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_card(post):
+    """Карточка поста из кэша фрагментов."""
+    return mark_safe(get_post_card(
+        post,
+        lambda: render_to_string('includes/post_card.html', {'post': post})))
+
+
+@register.inclusion_tag('includes/post_image.html')
+def post_image(post, sizes='(max-width: 40rem) 100vw, 40rem',
+               loading='lazy'):
+    """
+    Изображение поста с уменьшенными копиями в srcset.
+    Размеры, заглушка и список копий берутся из полей поста,
+    файлы не читаются.
+    """
+    sources = {}
+    if post.image_variants:
+        sources = image_sources(
+            post.image, post.image_width, post.image_variants)
+    elif post.image_variants is None and not post.image_pending:
+        # изображение загружено до появления копий в БД; пока копии
+        # создаются в фоне, выводится только оригинал
+        request_image_job(post)
+    return {
+        'image': post.image,
+        'sources': sources,
+        'width': post.image_width,
+        'height': post.image_height,
+        'placeholder': post.image_placeholder,
+        'sizes': sizes,
+        'loading': loading,
+    }
+
+
+@register.simple_tag(takes_context=True)
+def personal(context, template_name, **params):
+    """
+    Персональный фрагмент страницы.
+    На кэшируемых страницах выводится заглушкой, которая заменяется
+    фрагментом для текущего пользователя при отдаче ответа.
+    """
+    if context.get('punch_holes'):
+        return mark_safe(make_hole(template_name, params))
+    template = context.template.engine.get_template(template_name)
+    with context.push(**params):
+        return template.render(context)
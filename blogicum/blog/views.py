@@ -1,18 +1,24 @@
 from django.contrib.auth.mixins import (LoginRequiredMixin,
                                         PermissionRequiredMixin,
                                         UserPassesTestMixin)
+from django.core.paginator import Paginator
+from django.db import transaction
 from django.shortcuts import get_object_or_404, redirect
-from django.utils import timezone
 from django.urls import reverse_lazy
+from django.utils.functional import cached_property
 from django.views.generic import (CreateView, DeleteView,
                                   DetailView, ListView, UpdateView)
 from django.http import Http404
 
 from .models import Post, Category, Comment, User
+from blog.cache import get_profile_user, post_tags
 from blog.forms import PostForm, CommentForm, ProfileUpdateForm
+from blog.mixins import (CachedCountMixin, CursorPaginationMixin,
+                         ElidedPageRangeMixin, PageCacheMixin)
 
 
-class PostListView(ListView):
+class PostListView(PageCacheMixin, CursorPaginationMixin,
+                   CachedCountMixin, ElidedPageRangeMixin, ListView):
     """Отображения списка постов."""
     template_name = 'blog/index.html'
     model = Post
@@ -20,20 +26,47 @@ class PostListView(ListView):
     paginate_by = 10
 
     def get_queryset(self):
-        queryset = super().get_queryset()
-        queryset = queryset.filter(
-            is_published=True,
-            pub_date__lte=timezone.now(),
-            category__is_published=True).select_related('author')
-        return queryset
+        return Post.objects.published().order_by(self.ordering)
+
+    def get_base_cache_tags(self):
+        return {'feed'}
+
+    def get_cache_tags(self, context):
+        return post_tags(context['page_obj'])
 
 
-class PostDetailView(UserPassesTestMixin, DetailView):
+class PostDetailView(PageCacheMixin, UserPassesTestMixin,
+                     DetailView):
     """Отображение конкретного поста."""
     model = Post
     template_name = 'blog/detail.html'
     pk_url_kwarg = 'post_id'
     context_object_name = 'post'
+    comments_paginate_by = 50
+    comments_page_kwarg = 'comments_page'
+
+    def get_queryset(self):
+        return Post.objects.with_related()
+
+    def get_base_cache_tags(self):
+        return {f'post:{self.kwargs[self.pk_url_kwarg]}'}
+
+    def get_cache_tags(self, context):
+        return post_tags([context['post']]) | {
+            f'user:{comment.author_id}' for comment in context['comments']}
+
+    def get_hole_context(self):
+        return {'form': CommentForm()}
+
+    def is_shared_page(self, context):
+        # снятый с публикации пост виден только автору
+        return context['post'].is_published
+
+    def get_object(self, queryset=None):
+        # пост запрашивается из БД один раз за запрос
+        if getattr(self, 'object', None) is None:
+            self.object = super().get_object(queryset)
+        return self.object
 
     def test_func(self):
         # проверяем, является ли текущий
@@ -54,32 +87,46 @@ class PostDetailView(UserPassesTestMixin, DetailView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['form'] = CommentForm()
-        post = self.get_object()
-        context['comments'] = post.comments.all()
+        # число комментариев считается запросом по индексу (post,
+        # created_at): со счётчиком поста при его расхождении
+        # с таблицей комментарии пропадали бы со страниц
+        paginator = Paginator(
+            self.object.comments.select_related('author'),
+            self.comments_paginate_by)
+        comments = paginator.get_page(
+            self.request.GET.get(self.comments_page_kwarg))
+        context['comments'] = comments
+        context['comments_page_kwarg'] = self.comments_page_kwarg
         return context
 
 
-class CategoryPost(ListView):
+class CategoryPost(PageCacheMixin, CursorPaginationMixin,
+                   CachedCountMixin, ElidedPageRangeMixin, ListView):
     """Отображения списка категорий."""
     model = Post
     template_name = 'blog/category.html'
-    context_object_name = 'page_obj'
     paginate_by = 10
 
-    def setup(self, request, *args, **kwargs):
-        super().setup(request, *args, **kwargs)
+    @cached_property
+    def category(self):
+        # категория запрашивается только при рендеринге страницы,
+        # закэшированная страница отдаётся без обращения к БД
         category_slug = self.kwargs['slug']
-        self.category = get_object_or_404(
+        return get_object_or_404(
             Category,
             slug=category_slug,
             is_published=True
         )
 
     def get_queryset(self):
-        return self.category.post_set.filter(
-            pub_date__lte=timezone.now(),
-            is_published=True
-        ).order_by('-pub_date')
+        return self.category.post_set.published().order_by('-pub_date')
+
+    def get_base_cache_tags(self):
+        return {f'category:{self.category.pk}',
+                f'category-posts:{self.category.pk}'}
+
+    def get_cache_tags(self, context):
+        return post_tags(context['page_obj'])
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -87,7 +134,8 @@ class CategoryPost(ListView):
         return context
 
 
-class ProfileListView(ListView):
+class ProfileListView(PageCacheMixin, CursorPaginationMixin,
+                      CachedCountMixin, ElidedPageRangeMixin, ListView):
     """
     Просмотр профиля
     """
@@ -96,15 +144,24 @@ class ProfileListView(ListView):
     context_object_name = 'profile'
     paginate_by = 10
 
+    @cached_property
+    def profile(self):
+        # пользователь запрашивается только при рендеринге страницы
+        return get_profile_user(self.kwargs['username'])
+
     def get_queryset(self):
-        user = get_object_or_404(User, username=self.kwargs['username'])
-        posts = user.post_set.all().order_by('-pub_date')
-        return posts
+        return Post.objects.with_related().filter(
+            author=self.profile).order_by('-pub_date')
+
+    def get_base_cache_tags(self):
+        return {f'user:{self.profile.pk}', f'profile-posts:{self.profile.pk}'}
+
+    def get_cache_tags(self, context):
+        return post_tags(context['page_obj'])
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        user = get_object_or_404(User, username=self.kwargs['username'])
-        context['profile'] = user
+        context['profile'] = self.profile
         context['page_number'] = self.request.GET.get('page')
         return context
 
@@ -205,7 +262,9 @@ class CommentCreateView(LoginRequiredMixin, CreateView):
     def form_valid(self, form):
         form.instance.author = self.request.user
         form.instance.post = get_object_or_404(Post, pk=self.kwargs['post_id'])
-        return super().form_valid(form)
+        # комментарий и счётчик комментариев поста меняются вместе
+        with transaction.atomic():
+            return super().form_valid(form)
 
 
 class EditCommentView(LoginRequiredMixin, UpdateView):
@@ -236,6 +295,11 @@ class DeleteCommentView(LoginRequiredMixin, DeleteView):
         queryset = super().get_queryset()
         return queryset.filter(author=self.request.user)
 
+    def delete(self, request, *args, **kwargs):
+        # комментарий и счётчик комментариев поста меняются вместе
+        with transaction.atomic():
+            return super().delete(request, *args, **kwargs)
+
     def get_success_url(self):
         return reverse_lazy(
             'blog:detail',
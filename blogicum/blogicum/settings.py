@@ -155,3 +155,67 @@ EMAIL_FILE_PATH = BASE_DIR / 'sent_emails'
 LOGIN_URL = 'login'
 
 MEDIA_ROOT = BASE_DIR / 'media'
+
+# Курсорная пагинация лент публикаций вместо постраничной
+BLOG_CURSOR_PAGINATION = False
+
+# Время жизни закэшированного числа постов в лентах, секунды
+BLOG_PAGINATOR_COUNT_TIMEOUT = 60
+
+# Пагинация без подсчёта числа постов: только ссылки «назад» и «вперёд»
+BLOG_PAGINATOR_HAS_NEXT_ONLY = False
+
+# Кэширование страниц блога целиком.
+# Страницы сбрасываются сигналами через общие версии тегов, поэтому
+# кэш должен быть общим для всех процессов сервера и поддерживать
+# атомарные add и incr (memcached, Redis): с LocMemCache по умолчанию
+# изменения сбрасывают кэш только в обработавшем их процессе,
+# а блокировки построения страниц и команда warm_cache не действуют
+# на другие процессы. Перед включением настройте CACHES, например:
+#
+# CACHES = {
+#     'default': {
+#         'BACKEND': 'blog.cache_backends.TwoTierCache',
+#         'LOCATION': 'shared',
+#     },
+#     'shared': {
+#         'BACKEND': 'django.core.cache.backends.memcached.'
+#                    'PyMemcacheCache',
+#         'LOCATION': '127.0.0.1:11211',
+#     },
+# }
+BLOG_PAGE_CACHE = False
+
+# Время жизни закэшированных страниц, секунды
+BLOG_PAGE_CACHE_TIMEOUT = 60 * 5
+
+# Отдача устаревших страниц с обновлением в фоне:
+# имя URL — (мягкое, жёсткое) время жизни страницы в кэше, секунды
+BLOG_PAGE_CACHE_STALE_WHILE_REVALIDATE = {
+    'index': (10, 60 * 5),
+    'category_posts': (10, 60 * 5),
+}
+
+# Время жизни закэшированных карточек постов, секунды
+BLOG_FRAGMENT_CACHE_TIMEOUT = 60 * 60
+
+# Шаг округления текущего времени в фильтрах видимости постов, секунды;
+# 0 — без округления
+BLOG_VISIBILITY_BUCKET = 60
+
+# Ширина уменьшенных копий изображений публикаций, пиксели
+BLOG_THUMBNAIL_WIDTHS = (320, 640, 960, 1280)
+
+# WebP-копии изображений публикаций и их качество
+BLOG_WEBP = True
+BLOG_WEBP_QUALITY = 80
+
+# Попытки обработки изображения и время, после которого
+# зависшая задача возвращается в очередь, секунды
+BLOG_IMAGE_JOB_MAX_ATTEMPTS = 3
+BLOG_IMAGE_JOB_TIMEOUT = 60 * 5
+
+# Блокировка на время построения страницы или фрагмента, секунды,
+# и сколько другие запросы ждут построенное значение
+BLOG_CACHE_LOCK_TIMEOUT = 10
+BLOG_CACHE_LOCK_WAIT = 1
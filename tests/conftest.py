@@ -41,6 +41,29 @@ def enable_debug_false():
         yield
 
 
+@pytest.fixture(autouse=True)
+def clear_caches():
+    from django.core.cache import caches
+
+    for cache in caches.all():
+        cache.clear()
+    yield
+
+
+@pytest.fixture(autouse=True)
+def disable_page_cache():
+    # страница из кэша отдаётся без контекста шаблона,
+    # который проверяют тесты
+    with override_settings(BLOG_PAGE_CACHE=False):
+        yield
+
+
+@pytest.fixture
+def page_cache():
+    with override_settings(BLOG_PAGE_CACHE=True):
+        yield
+
+
 class SafeImportFromContextManager:
     def __init__(
             self,
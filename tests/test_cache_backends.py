@@ -0,0 +1,140 @@
+from unittest import mock
+
+import pytest
+from django.core.cache import caches
+from django.test import override_settings
+
+from blog.cache import CacheLock, get_tag_versions, invalidate_tags
+from blog.cache_backends import TwoTierCache
+
+SHARED_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'two-tier-tests',
+    },
+}
+
+
+@pytest.fixture
+def shared_cache():
+    with override_settings(CACHES=SHARED_CACHES):
+        caches['shared'].clear()
+        yield caches['shared']
+
+
+def _worker(**options):
+    return TwoTierCache('shared', {'OPTIONS': {'SYNC_INTERVAL': 0, **options}})
+
+
+def test_local_hits_skip_shared_cache(shared_cache):
+    worker = _worker()
+    worker.set('key', {'value': 1})
+    with mock.patch.object(
+            shared_cache, 'get', wraps=shared_cache.get) as shared_get:
+        for _ in range(3):
+            assert worker.get('key') == {'value': 1}
+    keys = [call.args[0] for call in shared_get.call_args_list]
+    assert 'key' not in keys, (
+        "Убедитесь, что повторное чтение ключа не обращается к общему кэшу."
+    )
+    value = worker.get('key')
+    value['value'] = 2
+    assert worker.get('key') == {'value': 1}
+
+
+def test_invalidation_reaches_other_workers(shared_cache):
+    first, second = _worker(), _worker()
+    first.set('key', 1)
+    assert second.get('key') == 1
+    first.set('key', 2)
+    assert second.get('key') == 2, (
+        "Убедитесь, что запись в одном процессе удаляет значение из "
+        "кэша остальных процессов."
+    )
+    first.delete('key')
+    assert second.get('key') is None
+    first.set('counter', 1)
+    assert second.get('counter') == 1
+    first.incr('counter')
+    assert second.get('counter') == 2
+
+
+def test_clear_and_touch_reach_other_workers(shared_cache):
+    first, second = _worker(), _worker()
+    first.set('key', 1)
+    assert second.get('key') == 1
+    first.clear()
+    first.set('other', 1)
+    assert second.get('key') is None, (
+        "Убедитесь, что очистка кэша в одном процессе очищает кэш "
+        "остальных процессов."
+    )
+    first.set('key', 1)
+    assert second.get('key') == 1
+    with mock.patch.object(second.local, 'delete') as local_delete:
+        first.touch('key', 10)
+        second.get('key')
+    local_delete.assert_called_once_with(second._local_key('key', None))
+
+
+def test_lost_events_clear_local_cache(shared_cache):
+    first, second = _worker(), _worker()
+    first.set('key', 1)
+    assert second.get('key') == 1
+    first.set('key', 2)
+    shared_cache.delete_many(
+        [f'two-tier-cache:event:{number}' for number in range(1, 10)])
+    assert second.get('key') == 2
+
+
+def test_local_cache_is_bounded(shared_cache):
+    worker = _worker(LOCAL_MAX_ENTRIES=2)
+    for key in ('a', 'b', 'c'):
+        worker.set(key, key)
+    worker.get('b')
+    assert len(worker.local) == 2
+    assert worker.local.get(shared_cache.make_key('a')) is None
+
+    worker = _worker(LOCAL_MAX_SIZE=200)
+    worker.set('small', 'x')
+    worker.set('big', 'x' * 1000)
+    assert worker.local.get(shared_cache.make_key('big')) is None
+    assert worker.get('big') == 'x' * 1000, (
+        "Убедитесь, что значения больше лимита читаются из общего кэша."
+    )
+    assert worker.local.size <= 200
+
+
+def test_locks_stay_in_shared_cache(shared_cache):
+    first, second = _worker(), _worker()
+    with mock.patch.object(first, '_publish') as publish:
+        with mock.patch('blog.cache.cache', first):
+            lock = CacheLock('page')
+            assert lock.acquire()
+            lock.release()
+    assert not publish.called, (
+        "Убедитесь, что захват и снятие блокировки не публикуются "
+        "в канале инвалидации."
+    )
+    assert not len(first.local)
+    with mock.patch('blog.cache.cache', first):
+        assert CacheLock('page').acquire()
+    with mock.patch('blog.cache.cache', second):
+        assert not CacheLock('page').acquire()
+
+
+def test_page_cache_tags_across_workers(shared_cache):
+    first, second = _worker(), _worker()
+    with mock.patch('blog.cache.cache', first):
+        versions = get_tag_versions({'feed'})
+    with mock.patch('blog.cache.cache', second):
+        assert get_tag_versions({'feed'}) == versions
+    with mock.patch('blog.cache.cache', first):
+        invalidate_tags('feed')
+    with mock.patch('blog.cache.cache', second):
+        assert get_tag_versions({'feed'}) != versions, (
+            "Убедитесь, что сброс тегов страниц доходит до всех процессов."
+        )
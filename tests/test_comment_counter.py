@@ -0,0 +1,106 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from mixer.backend.django import Mixer
+
+from blog.models import Post
+
+pytestmark = [pytest.mark.django_db]
+
+
+def _comment_count(post):
+    return Post.objects.values_list(
+        'comment_count', flat=True).get(pk=post.pk)
+
+
+def test_counter_follows_views(
+        user_client, post_with_published_location
+):
+    post = post_with_published_location
+    user_client.post(
+        reverse('blog:add_comment', args=[post.pk]), {'text': 'Текст'})
+    user_client.post(
+        reverse('blog:add_comment', args=[post.pk]), {'text': 'Текст'})
+    assert _comment_count(post) == 2, (
+        "Убедитесь, что при создании комментария счётчик комментариев "
+        "поста увеличивается."
+    )
+
+    comment = post.comments.first()
+    user_client.post(
+        reverse('blog:delete_comment', args=[post.pk, comment.pk]))
+    assert _comment_count(post) == 1, (
+        "Убедитесь, что при удалении комментария счётчик комментариев "
+        "поста уменьшается."
+    )
+
+
+def test_counter_follows_cascade_delete(
+        mixer: Mixer, another_user, post_with_published_location
+):
+    post = post_with_published_location
+    mixer.cycle(3).blend('blog.Comment', post=post, author=another_user)
+    mixer.blend('blog.Comment', post=post)
+    assert _comment_count(post) == 4
+
+    another_user.delete()
+    assert _comment_count(post) == 1, (
+        "Убедитесь, что счётчик комментариев поста уменьшается при "
+        "каскадном удалении комментариев."
+    )
+
+
+def test_counter_follows_moved_comment(
+        mixer: Mixer, post_with_published_location
+):
+    post = post_with_published_location
+    other_post = mixer.blend('blog.Post', author=post.author)
+    comment = mixer.blend('blog.Comment', post=post)
+    comment.text = 'Новый текст'
+    comment.save()
+    assert _comment_count(post) == 1
+
+    comment.post = other_post
+    comment.save()
+    assert (_comment_count(post), _comment_count(other_post)) == (0, 1), (
+        "Убедитесь, что при переносе комментария в другой пост "
+        "счётчики комментариев обоих постов обновляются."
+    )
+
+
+def test_recount_comments(mixer: Mixer, post_with_published_location):
+    post = post_with_published_location
+    mixer.cycle(3).blend('blog.Comment', post=post)
+    Post.objects.update(comment_count=42)
+
+    call_command('recount_comments', batch_size=1, stdout=StringIO())
+    assert _comment_count(post) == 3, (
+        "Убедитесь, что команда `recount_comments` исправляет "
+        "рассинхронизированные счётчики комментариев."
+    )
+
+
+def test_recount_comments_counts_in_update(
+        mixer: Mixer, post_with_published_location
+):
+    post = post_with_published_location
+    mixer.cycle(2).blend('blog.Comment', post=post)
+    Post.objects.update(comment_count=0)
+
+    stdout = StringIO()
+    with CaptureQueriesContext(connection) as context:
+        call_command('recount_comments', stdout=stdout)
+    updates = [
+        query['sql'] for query in context.captured_queries
+        if query['sql'].startswith('UPDATE')
+    ]
+    assert updates and all('blog_comment' in sql for sql in updates), (
+        "Убедитесь, что команда `recount_comments` считает комментарии "
+        "в том же UPDATE, которым исправляет счётчик."
+    )
+    assert 'Исправлено счётчиков: 1' in stdout.getvalue()
+    assert _comment_count(post) == 2
@@ -0,0 +1,105 @@
+import pytest
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+# сигналы сбрасывают кэш после фиксации транзакции
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+@pytest.fixture(
+    autouse=True, params=[False, True], ids=['default', 'page-cache'])
+def page_cache_setting(request):
+    # условные запросы работают и без кэша страниц, включённого не везде
+    with override_settings(BLOG_PAGE_CACHE=request.param):
+        yield
+
+
+@pytest.fixture
+def conditional_urls(user, post_with_published_location, published_category):
+    return (
+        '/',
+        f'/category/{published_category.slug}/',
+        f'/profile/{user.username}/',
+        f'/posts/{post_with_published_location.id}/',
+    )
+
+
+def _validators(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.has_header('ETag'), (
+        f"Убедитесь, что страница `{url}` отдаётся с заголовком ETag."
+    )
+    return response['ETag'], response.get('Last-Modified')
+
+
+def test_not_modified_by_etag(unlogged_client, conditional_urls):
+    for url in conditional_urls:
+        etag, last_modified = _validators(unlogged_client, url)
+        assert last_modified, (
+            f"Убедитесь, что страница `{url}` для анонимного пользователя "
+            "отдаётся с заголовком Last-Modified."
+        )
+        unlogged_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        # отложенные публикации проверяются не на каждый запрос
+        with CaptureQueriesContext(connection) as context:
+            response = unlogged_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304, (
+            f"Убедитесь, что на условный запрос к странице `{url}` "
+            "с актуальным ETag возвращается ответ 304."
+        )
+        assert not response.content
+        assert not [
+            query for query in context.captured_queries
+            if '"blog_' in query['sql']
+        ]
+        response = unlogged_client.get(
+            url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        assert response.status_code == 304
+
+
+def test_etag_changes_after_update(
+        user_client, unlogged_client, post_with_published_location,
+        conditional_urls
+):
+    post = post_with_published_location
+    etags = {
+        url: _validators(unlogged_client, url)[0] for url in conditional_urls
+    }
+    post.title = 'Новый заголовок'
+    post.save()
+    for url, etag in etags.items():
+        response = unlogged_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200, (
+            f"Убедитесь, что после изменения поста страница `{url}` "
+            "отдаётся заново."
+        )
+        assert response['ETag'] != etag
+
+    detail_url = conditional_urls[-1]
+    etag, _ = _validators(unlogged_client, detail_url)
+    user_client.post(
+        f'/posts/{post.id}/comment/', data={'text': 'Новый комментарий'})
+    response = unlogged_client.get(detail_url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200, (
+        "Убедитесь, что после нового комментария страница поста "
+        "отдаётся заново."
+    )
+
+
+def test_etag_depends_on_user(
+        user_client, another_user_client, unlogged_client, conditional_urls
+):
+    for url in conditional_urls:
+        anonymous_etag, _ = _validators(unlogged_client, url)
+        etag, last_modified = _validators(user_client, url)
+        assert etag != anonymous_etag, (
+            f"Убедитесь, что ETag страницы `{url}` различается "
+            "для разных пользователей."
+        )
+        assert last_modified is None
+        response = another_user_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        response = user_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
@@ -0,0 +1,63 @@
+import pytest
+from mixer.backend.django import Mixer
+
+from blog.cache import fragment_stats
+from conftest import N_PER_PAGE
+
+pytestmark = [pytest.mark.django_db]
+
+
+@pytest.fixture
+def page_of_posts(mixer: Mixer, user, published_category, published_location):
+    return mixer.cycle(N_PER_PAGE).blend(
+        'blog.Post', author=user, category=published_category,
+        location=published_location)
+
+
+@pytest.fixture(autouse=True)
+def reset_stats():
+    fragment_stats.reset()
+
+
+def _render(client, url='/'):
+    fragment_stats.reset()
+    content = client.get(url).content.decode('utf-8')
+    return content, fragment_stats.hits, fragment_stats.misses
+
+
+def test_post_cards_are_cached(user_client, page_of_posts,
+                               published_category):
+    assert _render(user_client)[1:] == (0, N_PER_PAGE)
+    assert _render(user_client)[1:] == (N_PER_PAGE, 0), (
+        "Убедитесь, что карточки постов берутся из кэша фрагментов."
+    )
+    category_url = f'/category/{published_category.slug}/'
+    assert _render(user_client, category_url)[1:] == (N_PER_PAGE, 0), (
+        "Убедитесь, что карточки постов общие для всех страниц со списками."
+    )
+
+
+def test_post_card_version_changes(
+        mixer: Mixer, user_client, page_of_posts, published_location
+):
+    _render(user_client)
+    post = page_of_posts[0]
+    post.title = 'Новый заголовок'
+    post.save()
+    mixer.blend('blog.Comment', post=page_of_posts[1])
+    content, hits, misses = _render(user_client)
+    assert (hits, misses) == (N_PER_PAGE - 2, 2), (
+        "Убедитесь, что при изменении поста или числа его комментариев "
+        "перерисовывается только его карточка."
+    )
+    assert 'Новый заголовок' in content
+    assert 'Комментарии (1)' in content
+
+    published_location.name = 'Новое место'
+    published_location.save()
+    content, hits, misses = _render(user_client)
+    assert misses == N_PER_PAGE, (
+        "Убедитесь, что карточки перерисовываются при изменении "
+        "местоположения поста."
+    )
+    assert 'Новое место' in content
@@ -0,0 +1,65 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from mixer.backend.django import Mixer
+
+from conftest import N_PER_PAGE
+
+pytestmark = [pytest.mark.django_db]
+
+
+def _query_plan(sql):
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return ' '.join(str(row[-1]) for row in cursor.fetchall())
+
+
+def _listing_sql(client, url, table):
+    with CaptureQueriesContext(connection) as context:
+        client.get(url)
+    for query in context.captured_queries:
+        sql = query['sql']
+        if sql.startswith('SELECT') and f'FROM "{table}"' in sql and (
+                'LIMIT' in sql):
+            return sql
+    raise AssertionError(f"Не найден запрос списка на странице `{url}`.")
+
+
+@pytest.fixture
+def many_posts(mixer: Mixer, user, published_category, another_category):
+    return mixer.cycle(N_PER_PAGE * 2).blend(
+        'blog.Post', author=user,
+        category=mixer.sequence(published_category, another_category))
+
+
+def test_feed_uses_indexes(
+        unlogged_client, user, published_category, many_posts
+):
+    for url, index_name in (
+        ('/', 'post_published_idx'),
+        (f'/category/{published_category.slug}/',
+         'post_category_published_idx'),
+        (f'/profile/{user.username}/', 'post_author_pub_date_idx'),
+    ):
+        plan = _query_plan(_listing_sql(unlogged_client, url, 'blog_post'))
+        assert f'SEARCH blog_post USING INDEX {index_name}' in plan, (
+            f"Убедитесь, что запрос страницы `{url}` использует индекс "
+            f"`{index_name}`. План запроса: {plan}"
+        )
+        assert 'TEMP B-TREE' not in plan, (
+            f"Убедитесь, что публикации на странице `{url}` сортируются "
+            f"по индексу, без временной таблицы. План запроса: {plan}"
+        )
+
+
+def test_comments_use_index(
+        mixer: Mixer, unlogged_client, post_with_published_location
+):
+    post = post_with_published_location
+    mixer.cycle(3).blend('blog.Comment', post=post)
+    plan = _query_plan(_listing_sql(
+        unlogged_client, f'/posts/{post.id}/', 'blog_comment'))
+    assert 'comment_post_created_idx' in plan, (
+        "Убедитесь, что комментарии к посту выбираются по индексу "
+        f"`comment_post_created_idx`. План запроса: {plan}"
+    )
@@ -0,0 +1,348 @@
+import time
+from datetime import timedelta
+from unittest import mock
+
+import pytest
+from django.db import connection, transaction
+from django.contrib.auth.signals import user_logged_in
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from mixer.backend.django import Mixer
+
+from blog.cache import (SCHEDULED_KEY, CacheLock, get_tag_versions,
+                        page_cache_key)
+from blog.mixins import PageCacheMixin
+
+# сигналы сбрасывают кэш после фиксации транзакции
+pytestmark = [
+    pytest.mark.django_db(transaction=True),
+    pytest.mark.usefixtures('page_cache'),
+]
+
+
+def _get(client, url):
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(url)
+    assert response.status_code == 200
+    return response.content.decode('utf-8'), len(context.captured_queries)
+
+
+@pytest.fixture
+def cached_urls(post_with_published_location, published_category):
+    return (
+        '/',
+        f'/category/{published_category.slug}/',
+        f'/posts/{post_with_published_location.id}/',
+    )
+
+
+def test_anonymous_pages_are_cached(unlogged_client, cached_urls):
+    for url in cached_urls:
+        content, _ = _get(unlogged_client, url)
+        cached_content, num_queries = _get(unlogged_client, url)
+        assert num_queries == 0, (
+            f"Убедитесь, что страница `{url}` для анонимного пользователя "
+            "отдаётся из кэша без запросов к БД."
+        )
+        assert cached_content == content
+
+
+def test_login_keeps_cache(
+        unlogged_client, user, cached_urls, post_with_published_location
+):
+    for url in cached_urls:
+        _get(unlogged_client, url)
+    # вход сохраняет пользователя с update_fields=['last_login']
+    user_logged_in.send(sender=type(user), request=None, user=user)
+    for url in cached_urls:
+        _, num_queries = _get(unlogged_client, url)
+        assert num_queries == 0, (
+            "Убедитесь, что вход автора не сбрасывает кэш страниц "
+            f"с его постами, например `{url}`."
+        )
+
+    user.first_name = 'Новое'
+    user.save()
+    user.username = f'{user.username}-new'
+    user.save()
+    content, _ = _get(unlogged_client, cached_urls[0])
+    assert user.username in content, (
+        "Убедитесь, что изменение имени пользователя сбрасывает кэш "
+        "страниц с его постами."
+    )
+
+
+def _blog_queries(client, url):
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(url)
+    assert response.status_code == 200
+    return response.content.decode('utf-8'), [
+        query['sql'] for query in context.captured_queries
+        if '"blog_' in query['sql']
+    ]
+
+
+def test_authenticated_pages_are_personalized(
+        user, another_user, user_client, another_user_client,
+        unlogged_client, cached_urls
+):
+    *_, detail_url = cached_urls
+    for url in cached_urls:
+        _get(unlogged_client, url)
+        content, queries = _blog_queries(user_client, url)
+        assert not queries, (
+            f"Убедитесь, что страница `{url}` отдаётся из кэша и "
+            "авторизованному пользователю."
+        )
+        assert f'>{user.username}</a>' in content, (
+            f"Убедитесь, что на закэшированной странице `{url}` в шапке "
+            "выводится текущий пользователь."
+        )
+        assert 'blog-hole' not in content
+        another_content, _ = _blog_queries(another_user_client, url)
+        assert f'>{another_user.username}</a>' in another_content
+        assert f'>{user.username}</a>' not in another_content
+
+    author_content, _ = _blog_queries(user_client, detail_url)
+    another_content, _ = _blog_queries(another_user_client, detail_url)
+    anonymous_content, _ = _get(unlogged_client, detail_url)
+    assert f'{detail_url}edit/' in author_content, (
+        "Убедитесь, что на закэшированной странице поста автор видит "
+        "кнопки редактирования."
+    )
+    assert f'{detail_url}edit/' not in another_content
+    assert 'csrfmiddlewaretoken' in another_content, (
+        "Убедитесь, что на закэшированной странице поста авторизованный "
+        "пользователь видит форму комментария."
+    )
+    assert 'csrfmiddlewaretoken' not in anonymous_content
+
+
+def test_unpublished_post_is_not_shared(
+        user_client, unlogged_client, post_with_published_location
+):
+    post = post_with_published_location
+    post.is_published = False
+    post.save()
+    url = f'/posts/{post.id}/'
+    assert user_client.get(url).status_code == 200
+    assert unlogged_client.get(url).status_code == 404, (
+        "Убедитесь, что снятый с публикации пост, открытый автором, "
+        "не попадает в общий кэш."
+    )
+
+
+def test_new_comment_resets_pages(
+        mixer: Mixer, unlogged_client, cached_urls,
+        post_with_published_location
+):
+    for url in cached_urls:
+        _get(unlogged_client, url)
+    comment = mixer.blend(
+        'blog.Comment', post=post_with_published_location)
+    for url in cached_urls:
+        content, num_queries = _get(unlogged_client, url)
+        assert num_queries, (
+            f"Убедитесь, что кэш страницы `{url}` сбрасывается при "
+            "добавлении комментария к выведенному на ней посту."
+        )
+    assert comment.text.split()[0] in content
+
+
+def test_location_change_resets_pages(
+        unlogged_client, cached_urls, published_location
+):
+    for url in cached_urls:
+        _get(unlogged_client, url)
+    published_location.name = 'Новое место'
+    published_location.save()
+    for url in cached_urls:
+        content, _ = _get(unlogged_client, url)
+        assert 'Новое место' in content, (
+            f"Убедитесь, что кэш страницы `{url}` сбрасывается при "
+            "изменении местоположения поста."
+        )
+
+
+def test_other_category_keeps_cache(
+        mixer: Mixer, user, unlogged_client, cached_urls, another_category
+):
+    _, category_url, detail_url = cached_urls
+    _get(unlogged_client, category_url)
+    _get(unlogged_client, detail_url)
+    mixer.blend('blog.Post', author=user, category=another_category)
+    for url in (category_url, detail_url):
+        _, num_queries = _get(unlogged_client, url)
+        assert num_queries == 0, (
+            f"Убедитесь, что новый пост в другой категории не сбрасывает "
+            f"кэш страницы `{url}`."
+        )
+
+    content, num_queries = _get(unlogged_client, '/')
+    assert num_queries, (
+        "Убедитесь, что новый пост сбрасывает кэш главной страницы."
+    )
+
+
+def test_scheduled_post_resets_pages(
+        mixer: Mixer, user, unlogged_client, cached_urls, published_category
+):
+    index_url, category_url, _ = cached_urls
+    now = timezone.now()
+    post = mixer.blend(
+        'blog.Post', author=user, category=published_category,
+        is_published=True, pub_date=now + timedelta(hours=1))
+    for url in (index_url, category_url):
+        content, _ = _get(unlogged_client, url)
+        assert post.title not in content
+        _, num_queries = _get(unlogged_client, url)
+        assert num_queries == 0, (
+            f"Убедитесь, что отложенная публикация не мешает кэшировать "
+            f"страницу `{url}`."
+        )
+
+    with mock.patch(
+            'django.utils.timezone.now',
+            return_value=now + timedelta(hours=2)):
+        for url in (index_url, category_url):
+            content, _ = _get(unlogged_client, url)
+            assert post.title in content, (
+                f"Убедитесь, что кэш страницы `{url}` сбрасывается, "
+                "когда наступает время отложенной публикации."
+            )
+
+
+def test_scheduled_post_released_after_key_expired(
+        mixer: Mixer, user, unlogged_client, cached_urls, published_category
+):
+    index_url, category_url, _ = cached_urls
+    now = timezone.now()
+    post = mixer.blend(
+        'blog.Post', author=user, category=published_category,
+        is_published=True, pub_date=now + timedelta(hours=1))
+    profile_url = f'/profile/{user.username}/'
+    for url in (index_url, category_url, profile_url):
+        _get(unlogged_client, url)
+    # запись о ближайшей публикации истекла или вытеснена из кэша
+    cache.delete(SCHEDULED_KEY)
+
+    with mock.patch(
+            'django.utils.timezone.now',
+            return_value=now + timedelta(hours=2)):
+        for url in (index_url, category_url, profile_url):
+            content, _ = _get(unlogged_client, url)
+            assert post.title in content, (
+                f"Убедитесь, что кэш страницы `{url}` сбрасывается "
+                "при наступлении времени отложенной публикации, даже если "
+                "запись о ней вытеснена из кэша."
+            )
+
+
+def test_tags_reset_after_commit(
+        mixer: Mixer, user, post_with_published_location
+):
+    post_id = post_with_published_location.pk
+    tag = f'post:{post_id}'
+    before = get_tag_versions([tag])[tag]
+    with transaction.atomic():
+        mixer.blend('blog.Comment', post_id=post_id, author=user)
+        assert get_tag_versions([tag])[tag] == before, (
+            "Убедитесь, что кэш страниц сбрасывается только после "
+            "фиксации транзакции."
+        )
+    assert get_tag_versions([tag])[tag] > before
+
+
+def test_cache_lock():
+    lock, another_lock = CacheLock('page'), CacheLock('page')
+    assert lock.acquire()
+    assert not another_lock.acquire(), (
+        "Убедитесь, что блокировку кэша нельзя захватить дважды."
+    )
+    another_lock.release()
+    assert not CacheLock('page').acquire()
+    lock.release()
+    assert another_lock.acquire()
+
+
+def test_stale_page_while_rebuilding(
+        unlogged_client, cached_urls, post_with_published_location
+):
+    *_, detail_url = cached_urls
+    post = post_with_published_location
+    old_title = post.title
+    _get(unlogged_client, detail_url)
+    post.title = 'Новый заголовок'
+    post.save()
+
+    lock = CacheLock(page_cache_key(RequestFactory().get(detail_url)))
+    assert lock.acquire()
+    content, queries = _blog_queries(unlogged_client, detail_url)
+    assert old_title in content and not queries, (
+        "Убедитесь, что пока страницу строит другой процесс, "
+        "отдаётся её устаревшая версия без запросов к БД."
+    )
+    lock.release()
+    content, _ = _get(unlogged_client, detail_url)
+    assert 'Новый заголовок' in content
+
+
+@override_settings(BLOG_CACHE_LOCK_WAIT=0.1)
+def test_page_is_built_after_lock_wait(unlogged_client, cached_urls):
+    *_, detail_url = cached_urls
+    lock = CacheLock(page_cache_key(RequestFactory().get(detail_url)))
+    assert lock.acquire()
+    _get(unlogged_client, detail_url)
+    lock.release()
+
+
+def _wait_revalidation(url):
+    """Дожидается фонового обновления страницы."""
+    lock = CacheLock(page_cache_key(RequestFactory().get(url)))
+    while not lock.acquire():
+        time.sleep(0.01)
+    lock.release()
+
+
+@override_settings(BLOG_PAGE_CACHE_STALE_WHILE_REVALIDATE={'index': (0, 60)})
+def test_stale_while_revalidate(
+        unlogged_client, user_client, post_with_published_location, PostModel
+):
+    post = post_with_published_location
+    response = unlogged_client.get('/')
+    assert 'stale-while-revalidate=60' in response['Cache-Control'], (
+        "Убедитесь, что страница ленты отдаётся с заголовком "
+        "`Cache-Control: stale-while-revalidate`."
+    )
+    assert 'public' in response['Cache-Control']
+    assert 'private' in user_client.get('/')['Cache-Control']
+    _wait_revalidation('/')
+
+    # изменение без сигналов: страница устаревает только по времени
+    PostModel.objects.filter(pk=post.pk).update(title='Новый заголовок')
+    time.sleep(0.01)
+    content, _ = _get(unlogged_client, '/')
+    assert post.title in content, (
+        "Убедитесь, что устаревшая по времени страница ленты "
+        "отдаётся сразу, не дожидаясь рендеринга."
+    )
+    deadline = time.monotonic() + 5
+    while 'Новый заголовок' not in content:
+        assert time.monotonic() < deadline, (
+            "Убедитесь, что устаревшая страница ленты перестраивается в фоне."
+        )
+        time.sleep(0.05)
+        content, _ = _get(unlogged_client, '/')
+    _wait_revalidation('/')
+
+
+def test_csrf_pages_are_not_cached():
+    request = RequestFactory().get('/')
+    request.META['CSRF_COOKIE_USED'] = True
+    assert not PageCacheMixin().can_cache_response(
+        request, HttpResponse()), (
+        "Убедитесь, что страницы с CSRF-токеном не кэшируются."
+    )
@@ -0,0 +1,200 @@
+import re
+from datetime import timedelta
+
+import pytest
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from mixer.backend.django import Mixer
+
+from blog.paginators import invalidate_counts
+from conftest import N_PER_PAGE
+
+pytestmark = [pytest.mark.django_db]
+
+
+@pytest.fixture
+def feed_posts(mixer: Mixer, user, published_category):
+    # несколько постов с одинаковой датой, чтобы проверить сортировку по id
+    posts = mixer.cycle(N_PER_PAGE * 2).blend(
+        'blog.Post', author=user, category=published_category)
+    same_date = posts[0].pub_date
+    for post in posts[:4]:
+        post.pub_date = same_date
+        post.save()
+    return posts
+
+
+@pytest.fixture
+def feed_urls(user, published_category):
+    return (
+        '/',
+        f'/category/{published_category.slug}/',
+        f'/profile/{user.username}/',
+    )
+
+
+def _expected_order(posts):
+    return [
+        post.pk for post in
+        sorted(posts, key=lambda post: (post.pub_date, post.pk), reverse=True)
+    ]
+
+
+def _walk_forward(client, url):
+    ids, cursors = [], []
+    response = client.get(url)
+    while True:
+        page = response.context['page_obj']
+        ids.extend(post.pk for post in page)
+        if not page.has_next():
+            return ids, cursors, page
+        cursors.append(page.next_cursor)
+        response = client.get(url, {'cursor': page.next_cursor})
+
+
+@override_settings(BLOG_CURSOR_PAGINATION=True)
+def test_cursor_pagination_walks_feed(unlogged_client, feed_posts, feed_urls):
+    for url in feed_urls:
+        ids, cursors, last_page = _walk_forward(unlogged_client, url)
+        assert ids == _expected_order(feed_posts), (
+            f"Убедитесь, что курсорная пагинация на странице `{url}` "
+            "выдаёт все публикации без пропусков и повторов."
+        )
+
+        response = unlogged_client.get(
+            url, {'cursor': last_page.previous_cursor})
+        page = response.context['page_obj']
+        assert [post.pk for post in page] == ids[:N_PER_PAGE], (
+            f"Убедитесь, что ссылка на предыдущую страницу на `{url}` "
+            "ведёт к предыдущим публикациям."
+        )
+        assert f'?cursor={cursors[0]}' in response.content.decode('utf-8')
+
+
+@override_settings(BLOG_CURSOR_PAGINATION=True)
+def test_cursor_pagination_skips_count(unlogged_client, feed_posts):
+    with CaptureQueriesContext(connection) as context:
+        unlogged_client.get('/')
+    assert not any(
+        'COUNT(' in query['sql'] for query in context.captured_queries
+    ), "Убедитесь, что курсорная пагинация не подсчитывает все записи."
+
+
+@override_settings(BLOG_CURSOR_PAGINATION=True)
+def test_page_urls_still_work(unlogged_client, feed_posts):
+    response = unlogged_client.get('/', {'page': 2})
+    assert response.status_code == 200
+    page = response.context['page_obj']
+    assert page.number == 2, (
+        "Убедитесь, что ссылки вида `?page=` продолжают работать."
+    )
+    assert [post.pk for post in page] == _expected_order(
+        feed_posts)[N_PER_PAGE:]
+
+
+def test_invalid_cursor(unlogged_client, feed_posts):
+    response = unlogged_client.get('/', {'cursor': 'не-курсор'})
+    assert response.status_code == 404, (
+        "Убедитесь, что при некорректном курсоре возвращается ошибка 404."
+    )
+
+
+def test_category_renders_paginator(
+        unlogged_client, feed_posts, published_category
+):
+    content = unlogged_client.get(
+        f'/category/{published_category.slug}/').content.decode('utf-8')
+    assert re.search(r'href="\?page=2"', content), (
+        "Убедитесь, что на странице категории отображается пагинатор."
+    )
+
+
+def _count_queries(client, url, **params):
+    with CaptureQueriesContext(connection) as context:
+        client.get(url, params)
+    return [
+        query['sql'] for query in context.captured_queries
+        if 'COUNT(' in query['sql']
+    ]
+
+
+def test_paginator_count_is_cached(
+        mixer: Mixer, unlogged_client, feed_posts, feed_urls,
+        published_category
+):
+    for url in feed_urls:
+        assert len(_count_queries(unlogged_client, url)) == 1
+        assert not _count_queries(unlogged_client, url, page=2), (
+            f"Убедитесь, что на странице `{url}` число публикаций "
+            "берётся из кэша."
+        )
+
+    mixer.blend(
+        'blog.Post', author=feed_posts[0].author,
+        category=published_category)
+    response = unlogged_client.get('/')
+    assert response.context['paginator'].count == len(feed_posts) + 1, (
+        "Убедитесь, что закэшированное число публикаций сбрасывается "
+        "при изменении публикаций."
+    )
+
+
+@override_settings(BLOG_PAGINATOR_HAS_NEXT_ONLY=True)
+def test_has_next_only_paginator(unlogged_client, feed_posts, feed_urls):
+    for url in feed_urls:
+        with CaptureQueriesContext(connection) as context:
+            first = unlogged_client.get(url)
+        assert not any(
+            'COUNT(' in query['sql'] for query in context.captured_queries
+        ), (
+            f"Убедитесь, что на странице `{url}` в режиме без подсчёта "
+            "число публикаций не запрашивается."
+        )
+        assert first.context['page_obj'].has_next()
+        assert 'href="?page=2"' in first.content.decode('utf-8')
+
+        last = unlogged_client.get(url, {'page': 2})
+        assert len(last.context['page_obj']) == N_PER_PAGE
+        assert not last.context['page_obj'].has_next(), (
+            f"Убедитесь, что на последней странице `{url}` нет ссылки "
+            "на следующую страницу."
+        )
+        assert unlogged_client.get(url, {'page': 3}).status_code == 404
+
+
+def _page_links(client, url, page):
+    response = client.get(url, {'page': page})
+    assert response.status_code == 200
+    content = response.content.decode('utf-8')
+    return len(re.findall(r'<li class="page-item', content)), len(content)
+
+
+def test_elided_page_range(mixer: Mixer, unlogged_client, user,
+                           published_category, PostModel):
+    def add_posts(count):
+        PostModel.objects.bulk_create(
+            PostModel(
+                title='Заголовок', text='Текст', author=user,
+                category=published_category,
+                pub_date=published_category.created_at - timedelta(days=1))
+            for _ in range(count)
+        )
+        # bulk_create не отправляет сигналы
+        invalidate_counts()
+
+    add_posts(N_PER_PAGE * 10)
+    links, size = _page_links(unlogged_client, '/', 5)
+    add_posts(N_PER_PAGE * 90)
+    for page in (1, 5, 50, 100):
+        assert _page_links(unlogged_client, '/', page)[0] <= links, (
+            "Убедитесь, что пагинатор выводит сокращённый список страниц, "
+            "размер которого не растёт с числом публикаций."
+        )
+    # отличаться может только число цифр в номерах страниц
+    assert _page_links(unlogged_client, '/', 5)[1] - size < 100
+
+    content = unlogged_client.get('/', {'page': 50}).content.decode('utf-8')
+    for page in (1, 49, 51, 100):
+        assert f'href="?page={page}"' in content
+    assert 'href="?page=30"' not in content
@@ -0,0 +1,212 @@
+from datetime import timedelta
+from unittest import mock
+
+import pytest
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from mixer.backend.django import Mixer
+
+from conftest import N_PER_PAGE
+
+pytestmark = [pytest.mark.django_db]
+
+
+def _capture_queries(client, url):
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(url)
+    assert response.status_code == 200, (
+        f"Убедитесь, что страница `{url}` загружается без ошибок."
+    )
+    return [query['sql'] for query in context.captured_queries]
+
+
+def _comment_queries(client, url):
+    return [
+        sql for sql in _capture_queries(client, url)
+        if 'blog_comment' in sql
+    ]
+
+
+@pytest.fixture
+def listing_urls(user, published_category):
+    return (
+        '/',
+        f'/category/{published_category.slug}/',
+        f'/profile/{user.username}/',
+    )
+
+
+def test_comment_count_without_queries(
+        mixer: Mixer, user, published_category, published_location,
+        unlogged_client, listing_urls
+):
+    posts = mixer.cycle(N_PER_PAGE).blend(
+        'blog.Post', author=user, category=published_category,
+        location=published_location)
+    for post in posts:
+        mixer.cycle(2).blend('blog.Comment', post=post)
+
+    for url in listing_urls:
+        assert not _comment_queries(unlogged_client, url), (
+            f"Убедитесь, что на странице `{url}` количество комментариев "
+            "берётся из счётчика поста без запросов к таблице комментариев."
+        )
+    content = unlogged_client.get('/').content.decode('utf-8')
+    assert 'Комментарии (2)' in content, (
+        "Убедитесь, что под постами отображается количество комментариев."
+    )
+
+
+@pytest.fixture
+def listing_num_queries(listing_urls):
+    index_url, category_url, profile_url = listing_urls
+    return {
+        index_url: 2,
+        category_url: 3,
+        profile_url: 3,
+    }
+
+
+def test_listing_query_count(
+        mixer: Mixer, user, published_category, unlogged_client,
+        listing_num_queries
+):
+    locations = mixer.cycle(N_PER_PAGE).blend(
+        'blog.Location', is_published=True)
+    mixer.cycle(N_PER_PAGE).blend(
+        'blog.Post', author=user, category=published_category,
+        location=mixer.sequence(*locations))
+
+    for url, num_queries in listing_num_queries.items():
+        assert len(_capture_queries(unlogged_client, url)) == num_queries, (
+            f"Убедитесь, что страница `{url}` загружает автора, категорию и "
+            "местоположение постов одним запросом вместе с постами."
+        )
+
+
+def test_detail_query_count(unlogged_client, post_with_published_location):
+    url = f'/posts/{post_with_published_location.id}/'
+    queries = _capture_queries(unlogged_client, url)
+    post_queries = [sql for sql in queries if 'FROM "blog_post"' in sql]
+    assert len(post_queries) == 1, (
+        "Убедитесь, что на странице поста пост запрашивается из БД "
+        "один раз за запрос."
+    )
+    # у поста без комментариев запрашивается только их число
+    assert len(queries) == 2, (
+        "Убедитесь, что на странице поста автор, категория и "
+        "местоположение загружаются одним запросом вместе с постом."
+    )
+
+
+def test_profile_user_lookup(unlogged_client, user, another_user,
+                             post_with_published_location,
+                             django_capture_on_commit_callbacks):
+    url = f'/profile/{user.username}/'
+    user_queries = [
+        sql for sql in _capture_queries(unlogged_client, url)
+        if 'FROM "auth_user"' in sql
+    ]
+    assert len(user_queries) == 1, (
+        "Убедитесь, что на странице профиля пользователь "
+        "запрашивается из БД один раз."
+    )
+    assert '"auth_user"."password"' not in user_queries[0], (
+        "Убедитесь, что для страницы профиля из БД читаются только "
+        "нужные шаблону поля пользователя."
+    )
+    assert not [
+        sql for sql in _capture_queries(unlogged_client, url)
+        if 'FROM "auth_user"' in sql
+    ], (
+        "Убедитесь, что поля пользователя для страницы профиля "
+        "берутся из кэша."
+    )
+
+    old_username = user.username
+    user.username = f'{another_user.username}-new'
+    with django_capture_on_commit_callbacks(execute=True):
+        user.save()
+    assert unlogged_client.get(url).status_code == 404, (
+        "Убедитесь, что после смены имени пользователя страница со "
+        "старым именем недоступна."
+    )
+    assert unlogged_client.get(
+        f'/profile/{user.username}/').status_code == 200
+
+    another_user.username = old_username
+    with django_capture_on_commit_callbacks(execute=True):
+        another_user.save()
+    response = unlogged_client.get(url)
+    assert response.context['profile'] == another_user, (
+        "Убедитесь, что после смены имён пользователей страница профиля "
+        "показывает актуального владельца имени."
+    )
+
+    another_user.first_name = 'Новое имя'
+    with django_capture_on_commit_callbacks(execute=True):
+        another_user.save()
+    response = unlogged_client.get(url)
+    assert response.context['profile'].first_name == 'Новое имя'
+
+
+def test_detail_comments_are_paginated(
+        mixer: Mixer, unlogged_client, post_with_published_location
+):
+    post = post_with_published_location
+    url = f'/posts/{post.id}/'
+    authors = mixer.cycle(5).blend('auth.User')
+    mixer.cycle(60).blend(
+        'blog.Comment', post=post, author=mixer.sequence(*authors))
+
+    with CaptureQueriesContext(connection) as context:
+        response = unlogged_client.get(url)
+    # пост, число комментариев и комментарии с авторами
+    assert len(context.captured_queries) == 3, (
+        "Убедитесь, что авторы комментариев загружаются одним запросом "
+        "вместе с комментариями."
+    )
+    comments = response.context['comments']
+    assert len(comments) == 50, (
+        "Убедитесь, что комментарии к посту выводятся постранично."
+    )
+    assert 'comments_page=2' in response.content.decode('utf-8')
+    response = unlogged_client.get(url, {'comments_page': 2})
+    assert len(response.context['comments']) == 10
+
+
+def test_detail_comments_ignore_counter_drift(
+        mixer: Mixer, unlogged_client, post_with_published_location,
+        PostModel
+):
+    post = post_with_published_location
+    mixer.cycle(3).blend('blog.Comment', post=post)
+    PostModel.objects.filter(pk=post.pk).update(comment_count=0)
+    response = unlogged_client.get(f'/posts/{post.id}/')
+    assert len(response.context['comments']) == 3, (
+        "Убедитесь, что расхождение счётчика комментариев поста "
+        "не скрывает комментарии на его странице."
+    )
+
+
+@override_settings(BLOG_VISIBILITY_BUCKET=60)
+def test_visibility_filter_is_bucketed(unlogged_client, listing_urls,
+                                       post_with_published_location):
+    index_url, category_url, _ = listing_urls
+    start = timezone.now().replace(second=0, microsecond=0)
+    for url in (index_url, category_url):
+        queries = []
+        for seconds in (1, 59):
+            with mock.patch('django.utils.timezone.now',
+                            return_value=start + timedelta(seconds=seconds)):
+                # число постов кэшируется и запрашивается один раз
+                queries.append([
+                    sql for sql in _capture_queries(unlogged_client, url)
+                    if 'COUNT' not in sql
+                ])
+        assert queries[0] == queries[1], (
+            f"Убедитесь, что в пределах интервала BLOG_VISIBILITY_BUCKET "
+            f"страница `{url}` выполняет одинаковые SQL-запросы."
+        )
@@ -0,0 +1,420 @@
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+
+import pytest
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+from PIL import ExifTags, Image
+from PIL.PngImagePlugin import PngInfo
+
+from blog import images
+from blog.images import thumbnail_name, webp_name
+from blog.jobs import claim_jobs, requeue_stale_jobs, run_image_job
+from blog.models import ImageJob, StoredImage
+
+pytestmark = [pytest.mark.django_db]
+
+
+@pytest.fixture(autouse=True)
+def media_root(tmp_path):
+    with override_settings(
+            MEDIA_ROOT=tmp_path, BLOG_THUMBNAIL_WIDTHS=(320, 640, 1280)):
+        yield tmp_path
+
+
+def _jpeg(width, height):
+    buffer = BytesIO()
+    Image.new('RGB', (width, height), 'red').save(buffer, 'JPEG')
+    return ContentFile(buffer.getvalue())
+
+
+def _png_info(key, value):
+    info = PngInfo()
+    info.add_text(key, value)
+    return info
+
+
+def test_thumbnails_created_by_workers(
+        unlogged_client, post_with_published_location, PostModel
+):
+    post = post_with_published_location
+    post.image.save('photo.jpg', _jpeg(1000, 500))
+    post.refresh_from_db()
+    assert post.image_pending, (
+        "Убедитесь, что пост с новым изображением помечается как "
+        "ожидающий обработки."
+    )
+    assert (post.image_width, post.image_height) == (1000, 500), (
+        "Убедитесь, что размеры изображения сохраняются при загрузке."
+    )
+    job = post.image_jobs.get(image=post.image.name)
+    assert job.status == ImageJob.PENDING
+    assert not default_storage.exists(thumbnail_name(post.image.name, 320)), (
+        "Убедитесь, что уменьшенные копии создаются вне запроса."
+    )
+    content = unlogged_client.get('/').content.decode('utf-8')
+    assert 'img-thumbnail' in content and 'srcset' not in content
+
+    call_command('run_workers', workers=0, once=True, stdout=StringIO())
+    post.refresh_from_db()
+    assert not post.image_pending
+    assert post.image_jobs.get(image=post.image.name).status == ImageJob.DONE
+    assert post.image_placeholder.startswith('data:image/jpeg;base64,'), (
+        "Убедитесь, что задача обработки сохраняет заглушку изображения."
+    )
+    for width, height in ((320, 160), (640, 320)):
+        name = thumbnail_name(post.image.name, width)
+        with default_storage.open(name) as file:
+            assert Image.open(file).size == (width, height), (
+                "Убедитесь, что команда `run_workers` создаёт уменьшенные "
+                "копии изображений."
+            )
+    assert not default_storage.exists(
+        thumbnail_name(post.image.name, 1280))
+
+    for url in ('/', f'/posts/{post.id}/'):
+        content = unlogged_client.get(url).content.decode('utf-8')
+        assert content.count('img-thumbnail') == 1
+        thumbnail_url = default_storage.url(
+            thumbnail_name(post.image.name, 320))
+        assert f'srcset="{thumbnail_url} 320w, ' in content, (
+            f"Убедитесь, что на странице `{url}` изображение поста "
+            "выводится с уменьшенными копиями в srcset."
+        )
+        assert f'{post.image.url} 1000w"' in content
+        assert 'width="1000" height="500"' in content
+        assert f'url({post.image_placeholder})' in content
+        webp_url = default_storage.url(webp_name(post.image.name, 320))
+        assert (
+            f'<source type="image/webp" srcset="{webp_url} 320w, '
+            in content
+        ), (
+            f"Убедитесь, что на странице `{url}` изображение поста "
+            "предлагается браузеру в формате WebP."
+        )
+        webp_url = default_storage.url(webp_name(post.image.name))
+        assert f'{webp_url} 1000w"' in content
+    with default_storage.open(webp_name(post.image.name, 640)) as file:
+        assert Image.open(file).format == 'WEBP'
+
+
+@override_settings(BLOG_IMAGE_JOB_MAX_ATTEMPTS=2)
+def test_failed_image_job(post_with_published_location):
+    post = post_with_published_location
+    post.image.save('photo.jpg', _jpeg(1000, 500))
+    default_storage.delete(post.image.name)
+    call_command('run_workers', workers=0, once=True, stdout=StringIO())
+    job = post.image_jobs.get(image=post.image.name)
+    assert job.status == ImageJob.FAILED and job.attempts == 2, (
+        "Убедитесь, что задача с ошибкой повторяется и после исчерпания "
+        "попыток помечается как неудачная."
+    )
+    post.refresh_from_db()
+    assert not post.image_pending
+
+
+def test_stale_jobs_are_requeued(post_with_published_location):
+    post = post_with_published_location
+    post.image.save('photo.jpg', _jpeg(100, 100))
+    ImageJob.objects.exclude(image=post.image.name).delete()
+    ImageJob.objects.update(
+        status=ImageJob.RUNNING,
+        started_at=timezone.now() - timedelta(hours=1))
+    assert requeue_stale_jobs() == 1
+    assert claim_jobs(10) == [post.image_jobs.get(image=post.image.name).pk]
+    assert claim_jobs(10) == []
+
+
+def test_job_of_deleted_post(post_with_published_location, mixer):
+    post = post_with_published_location
+    post.image.save('photo.jpg', _jpeg(100, 100))
+    ImageJob.objects.exclude(image=post.image.name).delete()
+    [pk] = claim_jobs(10)
+    post.delete()
+    assert run_image_job(pk) == ImageJob.DONE, (
+        "Убедитесь, что задача удалённого поста пропускается."
+    )
+
+    other = mixer.blend('blog.Post', author=post.author)
+    other.image.save('other.jpg', _jpeg(100, 100))
+    ImageJob.objects.all().delete()
+    for _ in range(2):
+        ImageJob.objects.create(post=other, image=other.image.name)
+    stdout, stderr = StringIO(), StringIO()
+    with mock.patch(
+            'blog.management.commands.run_workers.run_image_job',
+            side_effect=[RuntimeError('boom'), ImageJob.DONE]):
+        call_command('run_workers', workers=0, once=True,
+                     stdout=stdout, stderr=stderr)
+    assert 'boom' in stderr.getvalue()
+    assert 'Выполнено задач: 1' in stdout.getvalue(), (
+        "Убедитесь, что ошибка одной задачи не останавливает "
+        "команду `run_workers`."
+    )
+
+
+@override_settings(BLOG_IMAGE_JOB_MAX_ATTEMPTS=2)
+def test_stale_jobs_fail_after_max_attempts(post_with_published_location):
+    post = post_with_published_location
+    post.image.save('photo.jpg', _jpeg(100, 100))
+    ImageJob.objects.exclude(image=post.image.name).delete()
+    ImageJob.objects.update(
+        status=ImageJob.RUNNING, attempts=2,
+        started_at=timezone.now() - timedelta(hours=1))
+    assert requeue_stale_jobs() == 0
+    job = post.image_jobs.get(image=post.image.name)
+    assert job.status == ImageJob.FAILED, (
+        "Убедитесь, что зависшая задача, исчерпавшая попытки, "
+        "не возвращается в очередь."
+    )
+    post.refresh_from_db()
+    assert not post.image_pending
+
+
+def test_uploaded_image_metadata_is_stripped(post_with_published_location):
+    post = post_with_published_location
+    exif = Image.Exif()
+    exif[ExifTags.Base.Orientation] = 6
+    exif[ExifTags.Base.Make] = 'Camera'
+    exif[ExifTags.Base.GPSInfo] = {
+        ExifTags.GPS.GPSLatitudeRef: 'N',
+        ExifTags.GPS.GPSLatitude: (55.0, 45.0, 0.0),
+    }
+    buffer = BytesIO()
+    Image.new('RGB', (200, 100), 'red').save(buffer, 'JPEG', exif=exif)
+    data = buffer.getvalue()
+    post.image.save('photo.jpg', ContentFile(data))
+    with default_storage.open(post.image.name) as file:
+        stored = file.read()
+    image = Image.open(BytesIO(stored))
+    assert dict(image.getexif()) == {ExifTags.Base.Orientation: 6}, (
+        "Убедитесь, что из загруженного изображения удаляются метаданные, "
+        "кроме ориентации."
+    )
+    # сжатые данные не перекодируются
+    assert stored[stored.index(b'\xff\xda'):] == data[data.index(
+        b'\xff\xda'):]
+    image.load()
+
+    buffer = BytesIO()
+    Image.new('RGB', (10, 10), 'red').save(
+        buffer, 'PNG', pnginfo=_png_info('Comment', 'secret'))
+    post.image.save('image.png', ContentFile(buffer.getvalue()))
+    with default_storage.open(post.image.name) as file:
+        image = Image.open(file)
+        image.load()
+        assert 'Comment' not in image.info
+
+
+def test_backfill_thumbnails(post_with_published_location, PostModel):
+    post = post_with_published_location
+    name = default_storage.save('image/old.jpg', _jpeg(800, 800))
+    PostModel.objects.filter(pk=post.pk).update(image=name)
+    call_command('make_thumbnails', stdout=StringIO())
+    assert default_storage.exists(thumbnail_name(name, 320)), (
+        "Убедитесь, что команда `make_thumbnails` создаёт уменьшенные копии "
+        "уже загруженных изображений."
+    )
+    assert default_storage.exists(thumbnail_name(name, 640))
+    post.refresh_from_db()
+    assert post.image_variants['widths'] == [320, 640]
+
+
+def test_old_image_is_queued_on_render(
+        unlogged_client, post_with_published_location, PostModel
+):
+    post = post_with_published_location
+    name = default_storage.save('image/old.jpg', _jpeg(800, 400))
+    PostModel.objects.filter(pk=post.pk).update(
+        image=name, image_pending=False)
+    ImageJob.objects.all().delete()
+    with mock.patch.object(
+            default_storage, 'open', side_effect=AssertionError):
+        for _ in range(2):
+            content = unlogged_client.get(
+                f'/posts/{post.id}/').content.decode('utf-8')
+            assert 'srcset' not in content
+    assert ImageJob.objects.filter(image=name).count() == 1, (
+        "Убедитесь, что изображение без сохранённых копий ставится "
+        "в очередь обработки один раз и не читается при рендеринге."
+    )
+
+    call_command('run_workers', workers=0, once=True, stdout=StringIO())
+    content = unlogged_client.get(f'/posts/{post.id}/').content.decode(
+        'utf-8')
+    thumbnail_url = default_storage.url(thumbnail_name(name, 320))
+    assert f'srcset="{thumbnail_url} 320w, ' in content
+    assert 'width="800" height="400"' in content
+
+
+def test_backfill_image_dimensions(
+        unlogged_client, post_with_published_location, PostModel
+):
+    post = post_with_published_location
+    name = default_storage.save('image/old.jpg', _jpeg(800, 400))
+    PostModel.objects.filter(pk=post.pk).update(
+        image=name, image_pending=False)
+    call_command('backfill_image_dimensions', stdout=StringIO())
+    post.refresh_from_db()
+    assert (post.image_width, post.image_height) == (800, 400), (
+        "Убедитесь, что команда `backfill_image_dimensions` заполняет "
+        "размеры уже загруженных изображений."
+    )
+    assert post.image_placeholder.startswith('data:image/jpeg;base64,')
+    assert len(post.image_placeholder) < 1000
+
+    content = unlogged_client.get('/').content.decode('utf-8')
+    assert 'width="800" height="400" loading="lazy"' in content, (
+        "Убедитесь, что изображения в ленте загружаются лениво."
+    )
+    content = unlogged_client.get(f'/posts/{post.id}/').content.decode(
+        'utf-8')
+    assert 'loading="eager"' in content
+
+
+def test_identical_uploads_share_file(
+        user_client, post_with_published_location, mixer, PostModel,
+        django_capture_on_commit_callbacks
+):
+    post = post_with_published_location
+    twin = mixer.blend(
+        'blog.Post', author=post.author, category=post.category)
+    post.image.save('photo.jpg', _jpeg(400, 400))
+    twin.image.save('copy.JPG', _jpeg(400, 400))
+    assert post.image.name == twin.image.name, (
+        "Убедитесь, что одинаковые загрузки хранятся одним файлом."
+    )
+    assert post.image.name.startswith('image/')
+    assert post.image.name.endswith('.jpg')
+    name = post.image.name
+    call_command('run_workers', workers=0, once=True, stdout=StringIO())
+    assert default_storage.exists(thumbnail_name(name, 320))
+
+    with django_capture_on_commit_callbacks(execute=True):
+        user_client.post(f'/posts/{post.id}/delete/')
+    assert not PostModel.objects.filter(pk=post.pk).exists()
+    assert default_storage.exists(name), (
+        "Убедитесь, что при удалении поста не удаляется изображение, "
+        "которое используют другие посты."
+    )
+    with django_capture_on_commit_callbacks(execute=True):
+        twin.image.save('other.jpg', _jpeg(200, 100))
+    assert twin.image.name != name
+    assert not default_storage.exists(name), (
+        "Убедитесь, что изображение удаляется, когда на него не остаётся "
+        "ссылок."
+    )
+    assert not default_storage.exists(thumbnail_name(name, 320))
+
+
+def test_webp_not_beneficial_is_remembered(
+        post_with_published_location, PostModel
+):
+    post = post_with_published_location
+    # шум, сжатый JPEG с низким качеством, WebP не уменьшает
+    buffer = BytesIO()
+    Image.effect_noise((400, 400), 100).convert('RGB').save(
+        buffer, 'JPEG', quality=30)
+    name = default_storage.save('image/noise.jpg', ContentFile(
+        buffer.getvalue()))
+    PostModel.objects.filter(pk=post.pk).update(image=name)
+    post.refresh_from_db()
+    with mock.patch.object(
+            images, 'encode_webp', wraps=images.encode_webp) as encode:
+        info = images.make_thumbnails(post.image)
+        webp_sources = [
+            source for source in info['webp_srcset'].split(', ') if source]
+        assert len(webp_sources) < encode.call_count
+        encode.reset_mock()
+        again = images.make_thumbnails(post.image)
+    assert encode.call_count == 0, (
+        "Убедитесь, что WebP-копия, которая не меньше оригинала, "
+        "не кодируется повторно."
+    )
+    assert again['webp_srcset'] == info['webp_srcset']
+
+
+def test_upload_during_release_keeps_file(
+        post_with_published_location, mixer,
+        django_capture_on_commit_callbacks
+):
+    post = post_with_published_location
+    post.image.save('photo.jpg', _jpeg(100, 100))
+    name = post.image.name
+    with django_capture_on_commit_callbacks() as callbacks:
+        post.delete()
+        # тот же файл загружают, пока удаление поста не зафиксировано
+        twin = mixer.blend('blog.Post', author=post.author)
+        twin.image.save('copy.jpg', _jpeg(100, 100))
+    for callback in callbacks:
+        callback()
+    assert twin.image.name == name
+    assert default_storage.exists(name), (
+        "Убедитесь, что файл, который параллельно загрузили заново, "
+        "не удаляется вместе с последней прежней ссылкой."
+    )
+    assert StoredImage.objects.get(name=name).references == 1
+
+
+def test_same_image_uploaded_again(
+        post_with_published_location, django_capture_on_commit_callbacks
+):
+    post = post_with_published_location
+    post.image.save('photo.jpg', _jpeg(100, 100))
+    name = post.image.name
+    post.image.save('again.jpg', _jpeg(100, 100))
+    assert post.image.name == name
+    assert StoredImage.objects.get(name=name).references == 1, (
+        "Убедитесь, что повторная загрузка того же изображения в пост "
+        "не добавляет лишнюю ссылку на файл."
+    )
+    with django_capture_on_commit_callbacks(execute=True):
+        post.delete()
+    assert not default_storage.exists(name)
+    assert not StoredImage.objects.filter(name=name).exists()
+
+
+def test_unreadable_image(unlogged_client, post_with_published_location,
+                          PostModel):
+    post = post_with_published_location
+    PostModel.objects.filter(pk=post.pk).update(
+        image='image/missing.jpg', image_pending=False)
+    content = unlogged_client.get(f'/posts/{post.id}/').content.decode(
+        'utf-8')
+    assert content.count('img-thumbnail') == 1
+    assert 'srcset' not in content
+
+    call_command('run_workers', workers=0, once=True, stdout=StringIO())
+    unlogged_client.get(f'/posts/{post.id}/')
+    assert not ImageJob.objects.filter(
+        image='image/missing.jpg', status=ImageJob.PENDING).exists(), (
+        "Убедитесь, что нечитаемое изображение не ставится в очередь "
+        "повторно."
+    )
+
+
+def test_webp_benchmark(media_root):
+    stdout = StringIO()
+    call_command('benchmark_webp', sample=2, stdout=stdout)
+    assert 'Изображений: 2' in stdout.getvalue()
+    assert 'сэкономлено' in stdout.getvalue(), (
+        "Убедитесь, что команда `benchmark_webp` выводит сэкономленные байты."
+    )
+
+    directory = media_root / 'image'
+    (directory / 'ab').mkdir(parents=True)
+    (directory / 'photo.jpg').write_bytes(_jpeg(200, 100).read())
+    (directory / 'ab' / 'abc.jpg').write_bytes(_jpeg(200, 100).read())
+    (directory / 'ab' / 'abc.w320.jpg').write_bytes(_jpeg(100, 50).read())
+    (directory / 'ab' / 'abc.jpg.webp').write_bytes(b'')
+    stdout = StringIO()
+    call_command('benchmark_webp', path=str(directory), stdout=stdout)
+    assert 'photo.jpg' in stdout.getvalue()
+    assert 'Изображений: 2' in stdout.getvalue(), (
+        "Убедитесь, что команда `benchmark_webp` обходит подкаталоги "
+        "хранилища и пропускает уменьшенные и WebP-копии."
+    )
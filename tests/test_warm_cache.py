@@ -0,0 +1,61 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from mixer.backend.django import Mixer
+
+pytestmark = [
+    pytest.mark.django_db(transaction=True),
+    pytest.mark.usefixtures('page_cache'),
+]
+
+
+def test_warm_cache(
+        mixer: Mixer, user, published_category, published_location,
+        unlogged_client, PostModel
+):
+    mixer.cycle(12).blend(
+        'blog.Post', author=user, category=published_category,
+        location=published_location, is_published=True)
+    stdout = StringIO()
+    call_command('warm_cache', category_pages=5, posts=3, workers=2,
+                 host='testserver', stdout=stdout)
+    output = stdout.getvalue()
+
+    category_url = f'/category/{published_category.slug}/'
+    recent = PostModel.objects.published()[:3]
+    warmed = (
+        '/', category_url, f'{category_url}?page=2', '/pages/about/',
+        '/pages/rules/',
+        *(f'/posts/{post.id}/' for post in recent),
+    )
+    for url in warmed:
+        assert f'  {url}\n' in output, (
+            f"Убедитесь, что команда `warm_cache` рендерит страницу `{url}` "
+            "и выводит время её рендеринга."
+        )
+    assert f'{category_url}?page=3' not in output
+    assert len([
+        url for url in output.split() if url.startswith('/posts/')
+    ]) == 3
+
+    for url in warmed[:3]:
+        with CaptureQueriesContext(connection) as context:
+            assert unlogged_client.get(url).status_code == 200
+        assert not context.captured_queries, (
+            f"Убедитесь, что после `warm_cache` страница `{url}` "
+            "отдаётся из кэша."
+        )
+
+
+def test_warm_cache_disabled(settings):
+    settings.BLOG_PAGE_CACHE = False
+    stdout = StringIO()
+    call_command('warm_cache', stdout=stdout)
+    assert 'BLOG_PAGE_CACHE' in stdout.getvalue(), (
+        "Убедитесь, что команда `warm_cache` предупреждает о выключенном "
+        "кэшировании страниц."
+    )
+    assert 'Прогрето' not in stdout.getvalue()